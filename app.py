@@ -1,8 +1,5 @@
 import streamlit as st
-import pandas as pd
-from data_cleaner import SleepDataCleaner
-from sleep_calculator import SleepCalculator
-import io
+from sleep_analyzer.profiling import StageProfiler, enable_logging
 
 st.set_page_config(page_title="Analizzatore Sonno", page_icon="😴", layout="wide")
 
@@ -28,39 +25,228 @@ def format_delta_hours(delta_hours):
         return f"{sign}{h}h"
     return f"{sign}{h}h {m}min"
 
+def format_clock(minutes):
+    """Formatta minuti dalla mezzanotte come orario HH:MM."""
+    if pd.isna(minutes):
+        return "-"
+    minutes = int(round(minutes)) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
 def format_minutes(mins):
     """Formatta minuti."""
     if pd.isna(mins) or mins == 0:
         return "0 min"
     return f"{mins:.0f} min"
 
+# ==================== CACHE ====================
+
+# I dati sono indicizzati per hash del contenuto del file: i rerun di Streamlit
+# (cambio cliente, click sui widget) non rileggono né ripuliscono il file.
+
+def file_content_hash(file_bytes):
+    """Hash SHA-256 del contenuto del file caricato."""
+    return content_hash(file_bytes)
+
+def format_load_stats(stats):
+    """Riepilogo della lettura del file (motore, tempo, memoria)."""
+    text = f"📥 Lettura {stats['engine']}: {stats['rows']} righe in {stats['seconds']:.2f}s"
+    if stats['rows_per_sec']:
+        text += f" ({stats['rows_per_sec']:,.0f} righe/s)"
+    if stats['peak_rss_mb']:
+        text += f" · picco memoria processo {stats['peak_rss_mb']:.0f} MB"
+    return text
+
+@st.cache_data(max_entries=8, show_spinner="Lettura del file...")
+def read_upload(file_hash, file_name, _file_bytes, _profiler=None):
+    """Legge il file grezzo con le sole colonne necessarie (cache per hash del contenuto)."""
+    loader = DiaryLoader(profiler=_profiler)
+    df = loader.load(_file_bytes, filename=file_name)
+    return df, loader.last_stats
+
+@st.cache_data(max_entries=8, show_spinner="Pulizia del file...")
+def load_and_clean(file_hash, file_name, _file_bytes, _profiler=None):
+    """Legge e pulisce il file (cache per hash del contenuto)."""
+    df, load_stats = read_upload(file_hash, file_name, _file_bytes, _profiler)
+    n_rows = len(df)
+
+    cleaner = SleepDataCleaner(profiler=_profiler)
+    df = cleaner.clean_data(df)
+
+    # Filtra righe con nome valido
+    df_clean = df[df['nome_cliente_normalizzato'].notna()]
+
+    if 'data_compilazione' in df_clean.columns:
+        df_clean = df_clean.sort_values('data_compilazione', ascending=True).reset_index(drop=True)
+
+    return n_rows, df_clean, load_stats
+
+@st.cache_resource
+def get_state_store():
+    """Archivio locale delle notti già elaborate (modalità incrementale)."""
+    from sleep_analyzer.sleep_store import SleepStateStore
+    return SleepStateStore()
+
+@st.cache_resource(max_entries=8, show_spinner="Lettura dall'archivio...")
+def query_store(revision, start, end, _profiler=None):
+    """Notti archiviate nel periodo (cache per revisione dell'archivio e periodo)."""
+    with (_profiler or StageProfiler(enabled=False)).stage('archivio_storico') as stage:
+        df_clean = get_state_store().query(start=start, end=end)
+        stage['rows'] = len(df_clean)
+    return df_clean[df_clean['nome_cliente_normalizzato'].notna()].reset_index(drop=True)
+
+def ingest_and_load(file_hash, file_name, file_bytes, start, end, profiler):
+    """Archivia solo le righe nuove del file e restituisce lo storico (nel periodo) con le metriche.
+
+    Un file già archiviato (stesso hash del contenuto) non viene né letto né
+    pulito: i dati arrivano direttamente dall'archivio.
+    """
+    store = get_state_store()
+    # File archiviati in questa sessione: i rerun mostrano ancora l'esito del loro caricamento
+    ingested = st.session_state.setdefault('archiviati', {})
+    upload = store.upload(file_hash)
+    if file_hash in ingested:
+        n_rows, n_new, load_stats = ingested[file_hash]
+        upload = None
+    elif upload is None:
+        df, load_stats = read_upload(file_hash, file_name, file_bytes, profiler)
+        with profiler.stage('archivio_ingest', rows=len(df)):
+            n_new = store.ingest(df, file_hash=file_hash, file_name=file_name)
+        n_rows = len(df)
+        ingested[file_hash] = (n_rows, n_new, load_stats)
+    else:
+        n_rows, n_new, load_stats = upload['righe'], 0, None
+
+    revision = store.revision()
+    df_clean = query_store(revision, start, end, profiler)
+    return n_rows, n_new, df_clean, load_stats, upload, revision
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def client_counts(data_key, incremental, _df_clean):
+    """Notti per cliente in ordine alfabetico: la selezione è disponibile prima dell'analisi."""
+    counts = _df_clean['nome_cliente_normalizzato'].astype(object).value_counts()
+    return {str(client): int(counts[client]) for client in sorted(counts.index, key=str)}
+
+@st.cache_resource
+def get_job_manager():
+    """Analisi in background condivise tra sessioni e rerun (un job per input e cliente)."""
+    from sleep_analyzer.jobs import JobManager
+    return JobManager(workers=1)
+
+# Fasi del job di analisi → testo della barra di avanzamento
+STAGE_LABELS = {
+    'metriche': "Calcolo delle metriche",
+    'indice_clienti': "Indice dei clienti",
+    'statistiche_coorte': "Statistiche di coorte",
+    'regolarita': "Regolarità del sonno",
+    'righe_cliente': "Notti del cliente",
+}
+
+@st.fragment(run_every=0.5)
+def job_progress(job):
+    """Avanzamento del job aggiornato ogni mezzo secondo; a fine job ricarica la pagina con i risultati."""
+    if job.done:
+        st.rerun()
+
+    progress = job.progress()
+    if progress['fase'] is None:
+        text = "⏳ In attesa di avvio..."
+    else:
+        text = f"⏳ {STAGE_LABELS.get(progress['fase'], progress['fase'])} ({progress['completate'] + 1}/{progress['totale']})"
+    st.progress(progress['frazione'], text=text)
+
+    if st.button("⏹️ Annulla analisi"):
+        job.cancel()
+        st.rerun()
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def results_sort_order(data_key, incremental, selected_client, column, ascending, _df_results):
+    """Ordine delle righe per la tabella (cache per file, cliente e ordinamento)."""
+    return sort_order(_df_results, column, ascending)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def export_results(data_key, selected_client, fmt, _df_results):
+    """File di export dei risultati (cache per hash del file, cliente e formato)."""
+    return export_bytes(_df_results, fmt)
+
 # ==================== UI ====================
 
 st.title("😴 Analizzatore Dati del Sonno")
 st.markdown("**Carica file Excel, seleziona il cliente e ottieni risultati validati**")
 
+incremental_mode = st.sidebar.checkbox(
+    "💽 Modalità incrementale",
+    value=False,
+    help="Archivia le notti in locale ed elabora solo le righe nuove di ogni file caricato."
+)
+
+# Periodo delle notti archiviate da analizzare (solo modalità incrementale: filtro eseguito dall'archivio)
+period = ()
+if incremental_mode:
+    period = st.sidebar.date_input(
+        "📅 Periodo",
+        value=(),
+        format="DD/MM/YYYY",
+        help="Analizza solo le notti archiviate tra le due date (vuoto: tutto lo storico)."
+    )
+start_date, end_date = period if len(period) == 2 else (None, None)
+
+show_performance = st.sidebar.checkbox(
+    "⏱️ Misura performance",
+    value=False,
+    help="Registra tempo, righe/s e memoria di ogni fase e li mostra nel pannello Performance."
+)
+
+# Profiler della singola esecuzione dello script (le fasi in cache non vengono rieseguite)
+profiler = StageProfiler(enabled=show_performance)
+if show_performance:
+    # Log JSON delle fasi sulla console del server
+    enable_logging()
+
+# Job di analisi in background del file e cliente selezionati (se avviato)
+job = None
+
 uploaded_file = st.file_uploader(
     "📁 Carica file Excel del diario del sonno",
-    type=['xlsx', 'xls']
+    type=['xlsx', 'xls', 'csv', 'parquet']
 )
 
 if uploaded_file:
-    try:
-        # Carica dati
-        df = pd.read_excel(uploaded_file)
-        st.success(f"✅ File caricato! {len(df)} righe trovate.")
-
-        # Pulisci dati
-        cleaner = SleepDataCleaner()
-        df = cleaner.clean_data(df)
+    # Librerie di analisi (pandas incluso) importate solo dopo il caricamento di un file:
+    # la pagina iniziale si apre senza pagarne l'import
+    import pandas as pd
+    from sleep_analyzer.data_cleaner import SleepDataCleaner
+    from sleep_analyzer.data_loader import DiaryLoader, content_hash
+    from sleep_analyzer.exporter import EXPORT_FORMATS, available_formats, export_bytes, export_filename
+    from sleep_analyzer.client_index import ALL_CLIENTS
+    from sleep_analyzer.results_table import DISPLAY_COLUMNS, PAGE_SIZES, display_columns, page_count, sort_order, format_page
+    from sleep_analyzer.quality import QUALITY_LABELS
+    from sleep_analyzer.cohort import COHORT_LABELS, metric_table
 
-        # Filtra righe con nome valido
-        df_clean = df[df['nome_cliente_normalizzato'].notna()].copy()
-
-        if 'data_compilazione' in df_clean.columns:
-            df_clean = df_clean.sort_values('data_compilazione', ascending=True).reset_index(drop=True)
+    try:
+        # Carica e pulisci dati (cache per contenuto del file)
+        file_bytes = uploaded_file.getvalue()
+        file_hash = file_content_hash(file_bytes)
+        if incremental_mode:
+            n_rows, n_new, df_clean, load_stats, upload, revision = ingest_and_load(
+                file_hash, uploaded_file.name, file_bytes, start_date, end_date, profiler
+            )
+            # Chiave dei risultati: lo storico dipende dall'archivio (revisione) e dal periodo, non solo dal file
+            data_key = (file_hash, revision, start_date, end_date)
+            if upload is None:
+                st.success(f"✅ File caricato! {n_rows} righe trovate, {n_new} nuove archiviate.")
+            else:
+                st.success(f"✅ File già archiviato il {upload['caricato_il'][:10]} ({n_rows} righe): dati letti dall'archivio.")
+            if start_date is not None:
+                st.caption(f"📅 Notti dal {start_date:%d/%m/%Y} al {end_date:%d/%m/%Y}: {len(df_clean)}")
+        else:
+            n_rows, df_clean, load_stats = load_and_clean(file_hash, uploaded_file.name, file_bytes, profiler)
+            data_key = file_hash
+            st.success(f"✅ File caricato! {n_rows} righe trovate.")
+        if load_stats is not None:
+            st.caption(format_load_stats(load_stats))
 
-        clienti = sorted(df_clean['nome_cliente_normalizzato'].dropna().unique())
+        counts = client_counts(data_key, incremental_mode, df_clean)
+        clienti = list(counts)
 
         st.markdown("---")
 
@@ -70,7 +256,7 @@ if uploaded_file:
         with col1:
             selected_client = st.selectbox(
                 "👤 Seleziona il cliente da analizzare:",
-                options=["Tutti i clienti"] + list(clienti),
+                options=[ALL_CLIENTS] + list(clienti),
                 index=0
             )
 
@@ -80,176 +266,293 @@ if uploaded_file:
         with col3:
             st.metric("Notti totali", len(df_clean))
 
-        # Filtra per cliente
-        if selected_client != "Tutti i clienti":
-            df_filtered = df_clean[df_clean['nome_cliente_normalizzato'] == selected_client].copy()
-            st.info(f"📊 Analizzando {len(df_filtered)} notti per **{selected_client}**")
+        if selected_client != ALL_CLIENTS:
+            st.info(f"📊 Analizzando {counts[selected_client]} notti per **{selected_client}**")
         else:
-            df_filtered = df_clean.copy()
-            st.info(f"📊 Analizzando {len(df_filtered)} notti per tutti i clienti")
+            st.info(f"📊 Analizzando {len(df_clean)} notti per tutti i clienti")
 
+        # Analisi in background per input e cliente: i rerun (widget, paginazione) non la interrompono
+        # e un risultato già calcolato viene riusato
+        jobs = get_job_manager()
+        analysis_key = (data_key, incremental_mode, selected_client)
+        job = jobs.get(analysis_key)
         if st.button("🚀 Analizza Dati", type="primary"):
-            with st.spinner("Calcolo in corso..."):
-                # Calcola metriche
-                calculator = SleepCalculator()
-                df_results = calculator.process_dataframe(df_filtered)
+            from sleep_analyzer.jobs import ANALYSIS_STAGES, run_analysis
+            job = jobs.submit(
+                analysis_key, run_analysis, jobs, data_key, df_clean, selected_client, incremental_mode,
+                stages=ANALYSIS_STAGES, profiler=StageProfiler(enabled=show_performance)
+            )
 
-                st.success("✅ Analisi completata!")
+        if job is not None and not job.done:
+            job_progress(job)
+        elif job is not None and job.status == 'annullato':
+            st.warning("⏹️ Analisi annullata. Premi di nuovo \"Analizza Dati\" per riavviarla.")
+        elif job is not None and job.status == 'errore':
+            st.error(f"❌ Errore durante l'analisi: {job.error}")
 
-                # ==================== STATISTICHE ====================
+        if job is not None and job.status == 'completato':
+            index = job.result['indice']
+            df_results = job.result['righe']
+            summary = job.result['riepilogo']
+
+            st.success("✅ Analisi completata!")
+
+            # ==================== STATISTICHE ====================
+
+            st.markdown("---")
+            st.subheader("📊 Statistiche Globali (Tutto il Periodo)")
+
+            if summary['notti_valide'] == 0:
+                st.warning("⚠️ Nessun dato valido trovato!")
+            else:
+                # Medie globali SOLO su dati validi
+                avg = summary['media']
+                avg_tib = avg['tempo_totale_a_letto_ore']
+                avg_tst = avg['durata_sonno_ore']
+                avg_eff = avg['efficienza_sonno']
+                avg_latency = avg['latenza_minuti']
+                avg_waso = avg['veglia_infrasonno_minuti']
+
+                col1, col2, col3, col4, col5 = st.columns(5)
+
+                with col1:
+                    st.metric("TIB Medio", format_hours_to_hhmm(avg_tib))
+
+                with col2:
+                    st.metric("TST Medio", format_hours_to_hhmm(avg_tst))
+
+                with col3:
+                    st.metric("Efficienza Media", f"{avg_eff:.1f}%")
+
+                with col4:
+                    st.metric("Latenza Media", format_minutes(avg_latency))
+
+                with col5:
+                    st.metric("WASO Medio", format_minutes(avg_waso))
+
+                # ==================== ULTIMI 7 GIORNI ====================
 
                 st.markdown("---")
-                st.subheader("📊 Statistiche Globali (Tutto il Periodo)")
+                st.subheader("📈 Statistiche Ultimi 7 Giorni")
 
-                # Filtra righe con dati validi per statistiche
-                df_valid = df_results[
-                    df_results['tempo_totale_a_letto_ore'].notna() &
-                    df_results['durata_sonno_ore'].notna()
-                ].copy()
+                # Ultimi 7 dati validi (anche se < 7)
+                n_last_7 = summary['notti_ultime']
 
-                if len(df_valid) == 0:
-                    st.warning("⚠️ Nessun dato valido trovato!")
+                if n_last_7 < 7:
+                    st.caption(f"⚠️ Medie calcolate sulle ultime {n_last_7} notti valide (meno di 7 disponibili)")
                 else:
-                    # Medie globali SOLO su dati validi
-                    avg_tib = df_valid['tempo_totale_a_letto_ore'].mean()
-                    avg_tst = df_valid['durata_sonno_ore'].mean()
-                    avg_eff = df_valid['efficienza_sonno'].mean()
-                    avg_latency = df_valid['latenza_minuti'].mean()
-                    avg_waso = df_valid['veglia_infrasonno_minuti'].mean()
+                    st.caption("Medie calcolate sulle ultime 7 notti valide")
 
-                    col1, col2, col3, col4, col5 = st.columns(5)
+                avg_7 = summary['media_ultime']
+                avg_tib_7 = avg_7['tempo_totale_a_letto_ore']
+                avg_tst_7 = avg_7['durata_sonno_ore']
+                avg_eff_7 = avg_7['efficienza_sonno']
+                avg_latency_7 = avg_7['latenza_minuti']
+                avg_waso_7 = avg_7['veglia_infrasonno_minuti']
 
-                    with col1:
-                        st.metric("TIB Medio", format_hours_to_hhmm(avg_tib))
+                col1, col2, col3, col4, col5 = st.columns(5)
 
-                    with col2:
-                        st.metric("TST Medio", format_hours_to_hhmm(avg_tst))
+                with col1:
+                    delta = avg_tib_7 - avg_tib
+                    st.metric("TIB Medio", format_hours_to_hhmm(avg_tib_7), 
+                             delta=f"{format_delta_hours(delta)} vs globale")
 
-                    with col3:
-                        st.metric("Efficienza Media", f"{avg_eff:.1f}%")
+                with col2:
+                    delta = avg_tst_7 - avg_tst
+                    st.metric("TST Medio", format_hours_to_hhmm(avg_tst_7),
+                             delta=f"{format_delta_hours(delta)} vs globale")
 
-                    with col4:
-                        st.metric("Latenza Media", format_minutes(avg_latency))
+                with col3:
+                    delta = avg_eff_7 - avg_eff
+                    st.metric("Efficienza Media", f"{avg_eff_7:.1f}%",
+                             delta=f"{delta:+.1f}% vs globale")
 
-                    with col5:
-                        st.metric("WASO Medio", format_minutes(avg_waso))
+                with col4:
+                    delta = avg_latency_7 - avg_latency
+                    st.metric("Latenza Media", format_minutes(avg_latency_7),
+                             delta=f"{delta:+.0f} min vs globale")
 
-                    # ==================== ULTIMI 7 GIORNI ====================
+                with col5:
+                    delta = avg_waso_7 - avg_waso
+                    st.metric("WASO Medio", format_minutes(avg_waso_7),
+                             delta=f"{delta:+.0f} min vs globale")
 
-                    st.markdown("---")
-                    st.subheader("📈 Statistiche Ultimi 7 Giorni")
+                # ==================== QUALITÀ DEI DATI ====================
+
+                st.markdown("---")
+                st.subheader("🧪 Qualità dei Dati")
+                st.caption("Valori scartati o corretti durante la pulizia e il calcolo delle metriche")
+
+                quality = summary['qualita']
+                columns = st.columns(len(QUALITY_LABELS))
+                for column, (key, label) in zip(columns, QUALITY_LABELS.items()):
+                    with column:
+                        st.metric(label, quality[key])
 
-                    # Ultimi 7 dati validi (anche se < 7)
-                    df_last_7 = df_valid.tail(7)
+                # ==================== STATISTICHE DI COORTE ====================
 
-                    if len(df_last_7) < 7:
-                        st.caption(f"⚠️ Medie calcolate sulle ultime {len(df_last_7)} notti valide (meno di 7 disponibili)")
-                    else:
-                        st.caption("Medie calcolate sulle ultime 7 notti valide")
+                st.markdown("---")
+                st.subheader("📐 Statistiche di Coorte")
+
+                # Percentili, trend e z-score di tutti i clienti: già calcolati dal job di analisi
+                df_cohort = index.cohort()
 
-                    avg_tib_7 = df_last_7['tempo_totale_a_letto_ore'].mean()
-                    avg_tst_7 = df_last_7['durata_sonno_ore'].mean()
-                    avg_eff_7 = df_last_7['efficienza_sonno'].mean()
-                    avg_latency_7 = df_last_7['latenza_minuti'].mean()
-                    avg_waso_7 = df_last_7['veglia_infrasonno_minuti'].mean()
+                stats_table = metric_table(index.cohort_stats(selected_client))
+                if selected_client == ALL_CLIENTS:
+                    st.caption("Percentili e trend su tutte le notti valide della coorte")
+                    stats_table = stats_table.drop(columns='Z-score')
+                else:
+                    st.caption("Percentili e trend delle notti valide del cliente; "
+                               "z-score della sua media rispetto alle medie di tutti i clienti")
+                st.dataframe(stats_table.round(2), use_container_width=True, hide_index=True)
+
+                if selected_client == ALL_CLIENTS:
+                    per_client = df_cohort.iloc[:-1]
+                    columns = {'nome_cliente_normalizzato': 'Cliente'}
+                    for col, label in COHORT_LABELS.items():
+                        columns[f'p50_{col}'] = f'{label} P50'
+                        columns[f'trend_settimanale_{col}'] = f'{label} trend'
+                        columns[f'z_{col}'] = f'{label} z'
+                    st.dataframe(
+                        per_client[list(columns)].rename(columns=columns).round(2),
+                        use_container_width=True, hide_index=True
+                    )
 
-                    col1, col2, col3, col4, col5 = st.columns(5)
+                # ==================== REGOLARITÀ ====================
+
+                st.markdown("---")
+                st.subheader("🕰️ Regolarità del Sonno")
+
+                df_regularity = index.regularity()
+
+                if selected_client != ALL_CLIENTS:
+                    reg = df_regularity.loc[selected_client]
+                    col1, col2, col3, col4 = st.columns(4)
 
                     with col1:
-                        delta = avg_tib_7 - avg_tib
-                        st.metric("TIB Medio", format_hours_to_hhmm(avg_tib_7), 
-                                 delta=f"{format_delta_hours(delta)} vs globale")
+                        st.metric("Ora a Letto Media", format_clock(reg['ora_letto_media']))
+                        st.caption(f"± {format_minutes(reg['ora_letto_dev_std_min'])} (dev. std circolare)")
 
                     with col2:
-                        delta = avg_tst_7 - avg_tst
-                        st.metric("TST Medio", format_hours_to_hhmm(avg_tst_7),
-                                 delta=f"{format_delta_hours(delta)} vs globale")
+                        st.metric("Risveglio Medio", format_clock(reg['ora_sveglia_media']))
+                        st.caption(f"± {format_minutes(reg['ora_sveglia_dev_std_min'])} (dev. std circolare)")
 
                     with col3:
-                        delta = avg_eff_7 - avg_eff
-                        st.metric("Efficienza Media", f"{avg_eff_7:.1f}%",
-                                 delta=f"{delta:+.1f}% vs globale")
+                        jetlag = reg['jetlag_sociale_ore']
+                        st.metric("Jetlag Sociale", "-" if pd.isna(jetlag) else f"{jetlag:+.1f} h")
+                        st.caption("Metà del sonno nel weekend rispetto ai giorni feriali")
 
                     with col4:
-                        delta = avg_latency_7 - avg_latency
-                        st.metric("Latenza Media", format_minutes(avg_latency_7),
-                                 delta=f"{delta:+.0f} min vs globale")
+                        sri = reg['indice_regolarita']
+                        st.metric("Indice di Regolarità (SRI)", "-" if pd.isna(sri) else f"{sri:.0f}")
+                        st.caption("Da -100 a 100, su notti consecutive")
+                else:
+                    df_reg = df_regularity.reset_index()
+                    st.dataframe(pd.DataFrame({
+                        'Cliente': df_reg['nome_cliente_normalizzato'],
+                        'Ora a Letto Media': df_reg['ora_letto_media'].map(format_clock),
+                        'Dev. Std Letto (min)': df_reg['ora_letto_dev_std_min'].round(0),
+                        'Risveglio Medio': df_reg['ora_sveglia_media'].map(format_clock),
+                        'Dev. Std Risveglio (min)': df_reg['ora_sveglia_dev_std_min'].round(0),
+                        'Jetlag Sociale (ore)': df_reg['jetlag_sociale_ore'].round(2),
+                        'SRI': df_reg['indice_regolarita'].round(1),
+                    }), use_container_width=True, hide_index=True)
+
+                # ==================== RIEPILOGO CLIENTI ====================
+
+                if selected_client == ALL_CLIENTS:
+                    st.markdown("---")
+                    st.subheader("👥 Riepilogo per Cliente")
+
+                    df_overview = index.overview()
+                    df_overview = df_overview[[
+                        'nome_cliente_normalizzato', 'notti', 'notti_valide',
+                        'media_tempo_totale_a_letto_ore', 'media_durata_sonno_ore', 'media_efficienza_sonno',
+                        'media_latenza_minuti', 'media_veglia_infrasonno_minuti', 'media_ultime_efficienza_sonno',
+                        *QUALITY_LABELS
+                    ]].rename(columns={
+                        'nome_cliente_normalizzato': 'Cliente',
+                        'notti': 'Notti',
+                        'notti_valide': 'Notti valide',
+                        'media_tempo_totale_a_letto_ore': 'TIB Medio (ore)',
+                        'media_durata_sonno_ore': 'TST Medio (ore)',
+                        'media_efficienza_sonno': 'Efficienza Media (%)',
+                        'media_latenza_minuti': 'Latenza Media (min)',
+                        'media_veglia_infrasonno_minuti': 'WASO Medio (min)',
+                        'media_ultime_efficienza_sonno': 'Eff Ultime 7',
+                        **QUALITY_LABELS
+                    }).round(2)
+                    st.dataframe(df_overview, use_container_width=True, hide_index=True)
+
+                # ==================== TABELLA DATI ====================
 
-                    with col5:
-                        delta = avg_waso_7 - avg_waso
-                        st.metric("WASO Medio", format_minutes(avg_waso_7),
-                                 delta=f"{delta:+.0f} min vs globale")
+                st.markdown("---")
+                st.subheader("📋 Dati Elaborati")
 
-                    # ==================== TABELLA DATI ====================
+                # Ordinamento e paginazione lato server: al browser arriva solo la pagina visibile
+                sortable = display_columns(df_results)
+                col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
 
-                    st.markdown("---")
-                    st.subheader("📋 Dati Elaborati")
-
-                    display_cols = [
-                        'nome_cliente_normalizzato',
-                        'data_compilazione',
-                        'tempo_totale_a_letto_ore',
-                        'durata_sonno_ore',
-                        'efficienza_sonno',
-                        'tempo_sveglio_letto_ore',
-                        'latenza_minuti',
-                        'veglia_infrasonno_minuti',
-                        'media_rolling_7gg_tib',
-                        'media_rolling_7gg_durata',
-                        'media_rolling_7gg_efficienza'
-                    ]
-
-                    display_cols_available = [c for c in display_cols if c in df_results.columns]
-                    df_display = df_results[display_cols_available].copy()
-
-                    # Formatta data
-                    if 'data_compilazione' in df_display.columns:
-                        df_display['Data'] = pd.to_datetime(df_display['data_compilazione']).dt.strftime('%Y-%m-%d')
-                        df_display = df_display.drop('data_compilazione', axis=1)
-
-                    # Rinomina colonne per visualizzazione
-                    rename_map = {
-                        'nome_cliente_normalizzato': 'Cliente',
-                        'tempo_totale_a_letto_ore': 'TIB (ore)',
-                        'durata_sonno_ore': 'TST (ore)',
-                        'efficienza_sonno': 'Efficienza (%)',
-                        'tempo_sveglio_letto_ore': 'Tempo Sveglio (ore)',
-                        'latenza_minuti': 'Latenza (min)',
-                        'veglia_infrasonno_minuti': 'WASO (min)',
-                        'media_rolling_7gg_tib': 'TIB Media 7gg',
-                        'media_rolling_7gg_durata': 'TST Media 7gg',
-                        'media_rolling_7gg_efficienza': 'Eff Media 7gg'
-                    }
-                    df_display = df_display.rename(columns=rename_map)
-
-                    # Arrotonda valori numerici
-                    for col in df_display.columns:
-                        if df_display[col].dtype in ['float64', 'float32']:
-                            df_display[col] = df_display[col].round(2)
+                with col1:
+                    sort_column = st.selectbox(
+                        "Ordina per",
+                        options=[None] + sortable,
+                        format_func=lambda c: "Data (ordine originale)" if c is None else DISPLAY_COLUMNS[c]
+                    )
 
-                    st.dataframe(df_display, use_container_width=True, hide_index=True)
+                with col2:
+                    descending = st.toggle("Decrescente", value=False)
 
-                    if len(df_results) > 50:
-                        st.caption(f"💡 Mostrate prime righe. Scarica l'Excel per vedere tutto.")
+                with col3:
+                    page_size = st.selectbox("Righe per pagina", options=PAGE_SIZES, index=1)
 
-                    # ==================== DOWNLOAD ====================
+                n_pages = page_count(len(df_results), page_size)
+                with col4:
+                    page = st.number_input(
+                        f"Pagina (di {n_pages})",
+                        min_value=1,
+                        max_value=n_pages,
+                        value=1,
+                        key=f"pagina_{selected_client}_{page_size}"
+                    )
 
-                    st.markdown("---")
-                    st.subheader("💾 Download Risultati")
+                positions = results_sort_order(
+                    data_key, incremental_mode, selected_client, sort_column, not descending, df_results
+                )
 
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        df_results.to_excel(writer, index=False, sheet_name='Risultati')
-                    output.seek(0)
+                with profiler.stage('render_tabella', rows=min(page_size, len(df_results))):
+                    df_display = format_page(df_results, positions, page, page_size)
+                    st.dataframe(df_display, use_container_width=True, hide_index=True)
 
-                    filename = f"risultati_{selected_client.replace(' ', '_')}.xlsx" if selected_client != "Tutti i clienti" else "risultati_tutti_clienti.xlsx"
+                first_row = (page - 1) * page_size + 1 if len(df_results) else 0
+                last_row = min(page * page_size, len(df_results))
+                st.caption(f"Righe {first_row}–{last_row} di {len(df_results)}. Scarica i risultati per vederli tutti.")
 
-                    st.download_button(
-                        label="📥 Scarica Excel con tutti i risultati",
-                        data=output,
-                        file_name=filename,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                # ==================== DOWNLOAD ====================
+
+                st.markdown("---")
+                st.subheader("💾 Download Risultati")
+
+                # Ogni file viene generato solo al click (in un thread separato) e messo in cache;
+                # on_click="ignore" evita il rerun che nasconderebbe i risultati
+                format_labels = {'xlsx': 'Excel', 'csv': 'CSV', 'parquet': 'Parquet'}
+                formats = available_formats()
+
+                def build_export(fmt):
+                    def build():
+                        with profiler.stage(f'export_{fmt}', rows=len(df_results)):
+                            return export_results(data_key, selected_client, fmt, df_results)
+                    return build
+
+                for col, fmt in zip(st.columns(len(formats)), formats):
+                    with col:
+                        st.download_button(
+                            label=f"📥 Scarica {format_labels[fmt]}",
+                            data=build_export(fmt),
+                            file_name=export_filename(selected_client, fmt),
+                            mime=EXPORT_FORMATS[fmt][1],
+                            on_click="ignore"
+                        )
 
     except Exception as e:
         st.error(f"❌ Errore durante l'elaborazione: {str(e)}")
@@ -258,6 +561,33 @@ if uploaded_file:
 else:
     st.info("👆 Carica un file Excel per iniziare l'analisi")
 
+# ==================== PERFORMANCE ====================
+
+def performance_table(stage_profiler):
+    """Fasi misurate come tabella (nomi indentati per profondità)."""
+    df_perf = stage_profiler.to_frame()
+    df_perf['stage'] = ['\u2003' * depth + name.split('/')[-1] for name, depth in zip(df_perf['stage'], df_perf['depth'])]
+    return df_perf.drop(columns='depth').rename(columns={
+        'stage': 'Fase',
+        'rows': 'Righe',
+        'seconds': 'Tempo (s)',
+        'rows_per_sec': 'Righe/s',
+        'memory_delta_mb': 'Δ Memoria (MB)'
+    })
+
+if profiler.enabled:
+    with st.expander("⏱️ Performance", expanded=False):
+        if len(profiler.records) == 0:
+            st.caption("Nessuna fase eseguita in questa esecuzione (risultati in cache).")
+        else:
+            st.dataframe(performance_table(profiler), use_container_width=True, hide_index=True)
+            st.caption("Le fasi già in cache non vengono rieseguite e non compaiono.")
+
+        # Fasi del job di analisi visualizzato (eseguito in background, fuori da questa esecuzione)
+        if job is not None and job.status == 'completato' and job.profiler.enabled:
+            st.markdown("**Analisi in background**")
+            st.dataframe(performance_table(job.profiler), use_container_width=True, hide_index=True)
+
 # ==================== TEST INFO ====================
 
 with st.expander("ℹ️ Info sui Calcoli"):
@@ -267,6 +597,7 @@ with st.expander("ℹ️ Info sui Calcoli"):
     - **TST** (Durata Sonno Effettiva) = M - I - J - L = Ora Sveglia Finale - Ora Spento Luci - Latenza - WASO
     - **Tempo Sveglio** = TIB - TST
     - **Efficienza Sonno** = (TST / TIB) × 100
+    - **Medie 7gg** = media mobile delle ultime 7 notti di ciascun cliente
 
     ### Validazione Outlier
     - Latenza > 120 min → rimosso
@@ -0,0 +1 @@
+"""Benchmark della pipeline di analisi del sonno (vedi bench_pipeline.py)."""
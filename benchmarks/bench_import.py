@@ -0,0 +1,127 @@
+"""Benchmark del tempo di avvio: `python -X importtime` dei punti di ingresso del pacchetto.
+
+Ogni import è misurato in un interprete nuovo (cache dei moduli vuota), più
+volte, tenendo la mediana. Oltre al totale riporta i moduli di primo livello
+più costosi, per capire quale dipendenza pesa sull'avvio.
+
+Esempio (dalla radice del repository):
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --compare benchmarks/results/import_precedente.json
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+from benchmarks.bench_pipeline import git_revision, RESULTS_DIR
+
+ENTRY_POINTS = [
+    'sleep_analyzer',
+    'sleep_analyzer.profiling',
+    'sleep_analyzer.data_cleaner',
+    'sleep_analyzer.sleep_calculator',
+    'sleep_analyzer.data_loader',
+    'sleep_analyzer.exporter',
+    'sleep_analyzer.sleep_store',
+    'sleep_analyzer.chunked_pipeline',
+    'sleep_analyzer.batch',
+    'sleep_analyzer.api_server',
+    'sleep_analyzer.jobs',
+]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(module):
+    """Tempi di import (µs, cumulativi) dei moduli importati da `import module` in un interprete nuovo."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=ROOT, check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        name = name[1:]  # spazio dopo il separatore; il resto dell'indentazione è la profondità
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append({'module': name.strip(), 'depth': depth, 'cumulative_us': int(cumulative_us)})
+    return times
+
+def bench_entry_point(module, repeat=5, top=5):
+    """Mediana del tempo totale di import e dipendenze di primo livello più costose."""
+    runs = [import_times(module) for _ in range(repeat)]
+    totals = [next(t['cumulative_us'] for t in run if t['module'] == module) for run in runs]
+
+    # Sottoalbero del modulo (le righe dei figli precedono quella del padre, con profondità maggiore);
+    # esclude i moduli importati all'avvio dell'interprete (site, ...)
+    last = runs[-1]
+    end = next(i for i, t in enumerate(last) if t['module'] == module)
+    start = end
+    while start > 0 and last[start - 1]['depth'] > last[end]['depth']:
+        start -= 1
+    subtree = last[start:end]
+    heaviest = sorted((t for t in subtree if t['depth'] == last[end]['depth'] + 1),
+                      key=lambda t: t['cumulative_us'], reverse=True)[:top]
+    return {
+        'entry_point': module,
+        'seconds': round(statistics.median(totals) / 1e6, 4),
+        'modules': len(subtree) + 1,
+        'heaviest': [{'module': t['module'], 'seconds': round(t['cumulative_us'] / 1e6, 4)} for t in heaviest],
+    }
+
+def compare(current, previous_path):
+    """Stampa il rapporto dei tempi rispetto a un file di risultati precedente."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    baseline = {r['entry_point']: r for r in previous['results']}
+
+    print(f"\nConfronto con {previous_path} (commit {previous.get('git_commit')})")
+    for r in current['results']:
+        old = baseline.get(r['entry_point'])
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+        flag = '⚠️ ' if ratio > 1.2 else ''
+        print(f"{flag}{r['entry_point']:<34} {old['seconds']:.3f}s → {r['seconds']:.3f}s (x{ratio:.2f})")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del tempo di import dei punti di ingresso.")
+    parser.add_argument('--modules', nargs='+', default=ENTRY_POINTS, help="Moduli da importare")
+    parser.add_argument('--repeat', type=int, default=5, help="Esecuzioni per modulo (default: 5, si usa la mediana)")
+    parser.add_argument('--output', help="File JSON dei risultati (default: benchmarks/results/import_<data>.json)")
+    parser.add_argument('--compare', help="File JSON di un'esecuzione precedente da confrontare")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': [],
+    }
+
+    for module in args.modules:
+        r = bench_entry_point(module, repeat=args.repeat)
+        report['results'].append(r)
+        heaviest = ', '.join(f"{h['module']} {h['seconds'] * 1000:.0f}ms" for h in r['heaviest'][:3])
+        print(f"{module:<34} {r['seconds'] * 1000:7.1f} ms ({r['modules']} moduli; {heaviest or '-'})")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"import_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
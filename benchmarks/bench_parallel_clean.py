@@ -0,0 +1,95 @@
+"""Benchmark di clean_data seriale e parallelo (SleepDataCleaner(workers=N)).
+
+Misura anche export "ad alta cardinalità" (ogni orario è una stringa diversa),
+il caso in cui il parsing dei valori distinti domina il tempo di pulizia.
+
+Esempio (dalla radice del repository):
+    python -m benchmarks.bench_parallel_clean --sizes 100000 1000000 --workers 1 2 4 8
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sleep_analyzer.data_cleaner import SleepDataCleaner, PARALLEL_MIN_VALUES
+from benchmarks.synthetic_data import generate_diary
+from benchmarks.bench_pipeline import measure, git_revision, RESULTS_DIR
+
+TIME_POSITIONS = [7, 8, 12, 13]
+
+def high_cardinality(raw):
+    """Rende unica ogni stringa di orario ("23:15" → "23:15/4711": stesso orario interpretato)."""
+    raw = raw.copy()
+    suffix = '/' + pd.Series(np.arange(len(raw))).astype(str).to_numpy(dtype=object)
+    for pos in TIME_POSITIONS:
+        raw.iloc[:, pos] = raw.iloc[:, pos].astype(str).to_numpy(dtype=object) + suffix
+    return raw
+
+def bench(raw, workers_list, threshold):
+    """Tempo di clean_data per ogni numero di processi; verifica che l'output sia identico al seriale."""
+    results = []
+    reference = None
+    for workers in workers_list:
+        cleaner = SleepDataCleaner(workers=workers, parallel_threshold=threshold)
+        try:
+            # Prima esecuzione: avvio del pool e cache calda non inclusi nella misura
+            cleaner.clean_data(raw)
+            cleaner.clear_cache()
+            df, seconds, _ = measure(cleaner.clean_data, raw, track_memory=False)
+        finally:
+            cleaner.close()
+
+        if reference is None:
+            reference = df
+        pd.testing.assert_frame_equal(df, reference)
+        results.append({'workers': workers, 'seconds': round(seconds, 4)})
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark di clean_data seriale e parallelo.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000], help="Numero di righe da testare")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help="Numeri di processi da testare")
+    parser.add_argument('--threshold', type=int, default=PARALLEL_MIN_VALUES,
+                        help=f"Valori distinti minimi per il parallelo (default: {PARALLEL_MIN_VALUES})")
+    parser.add_argument('--output', help="File JSON dei risultati (default: benchmarks/results/parallel_<data>.json)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers_list = sorted(set([1] + args.workers))
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'threshold': args.threshold,
+        'results': [],
+    }
+
+    for n_rows in args.sizes:
+        base = generate_diary(n_rows, n_clients=200)
+        for dataset, raw in [('realistico', base), ('alta_cardinalita', high_cardinality(base))]:
+            results = bench(raw, workers_list, args.threshold)
+            serial = results[0]['seconds']
+            for r in results:
+                r.update({'dataset': dataset, 'rows': n_rows, 'speedup': round(serial / r['seconds'], 2)})
+                report['results'].append(r)
+                print(f"{dataset:<17} {n_rows:>9} righe, {r['workers']} processi: {r['seconds']:.3f}s (x{r['speedup']:.2f})")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"parallel_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Benchmark delle fasi della pipeline (lettura, pulizia, calcolo) su dati sintetici.
+
+Esempio (dalla radice del repository):
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 100000 1000000
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/precedente.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sleep_analyzer.data_cleaner import SleepDataCleaner
+from sleep_analyzer.sleep_calculator import SleepCalculator
+from sleep_analyzer.data_loader import DiaryLoader
+from sleep_analyzer.client_index import ClientIndex
+from sleep_analyzer.cohort import cohort_statistics
+from benchmarks.synthetic_data import generate_diary
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def measure(func, *args, track_memory=True):
+    """Esegue func misurando il tempo e (in una seconda esecuzione) il picco di memoria allocata.
+
+    Il tempo è misurato senza tracemalloc, che rallenta il codice Python puro.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if track_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+
+    return result, seconds, peak_mb
+
+def git_revision():
+    """Commit corrente (se disponibile), per confrontare le versioni."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def bench_size(n_rows, n_clients, track_memory=True, seed=0):
+    """Misura ogni fase della pipeline su un export sintetico di n_rows righe."""
+    raw = generate_diary(n_rows, n_clients=n_clients, seed=seed)
+    results = []
+
+    def record(stage, seconds, peak_mb):
+        results.append({
+            'stage': stage,
+            'rows': n_rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(n_rows / seconds, 1) if seconds > 0 else None,
+            'peak_memory_mb': round(peak_mb, 2) if peak_mb is not None else None,
+        })
+
+    # Lettura (CSV: scrivere Excel da 1M righe richiederebbe decine di minuti)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'diario.csv')
+        raw.to_csv(path, index=False)
+        loaded, seconds, peak = measure(DiaryLoader().load, path, track_memory=track_memory)
+        record('load_csv', seconds, peak)
+
+    # Pulizia (cache nuova a ogni esecuzione, come per un caricamento nuovo)
+    df_clean, seconds, peak = measure(lambda df: SleepDataCleaner().clean_data(df), loaded, track_memory=track_memory)
+    record('clean_data', seconds, peak)
+
+    df_clean = df_clean[df_clean['nome_cliente_normalizzato'].notna()]
+    df_results, seconds, peak = measure(SleepCalculator().process_dataframe, df_clean, track_memory=track_memory)
+    record('process_dataframe', seconds, peak)
+
+    index, seconds, peak = measure(ClientIndex, df_results, track_memory=track_memory)
+    record('client_index', seconds, peak)
+
+    # Statistiche di coorte (ricalcolate a ogni esecuzione: l'indice le tiene in cache)
+    _, seconds, peak = measure(
+        lambda i: cohort_statistics(i.frame, i._group, i.clients, i._valid_mask(i.frame)),
+        index, track_memory=track_memory
+    )
+    record('cohort_statistics', seconds, peak)
+
+    _, seconds, peak = measure(SleepCalculator().calculate_regularity, df_results, track_memory=track_memory)
+    record('regularity', seconds, peak)
+
+    return results
+
+def compare(current, previous_path):
+    """Stampa il rapporto dei tempi rispetto a un file di risultati precedente."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    baseline = {(r['stage'], r['rows']): r for r in previous['results']}
+
+    print(f"\nConfronto con {previous_path} (commit {previous.get('git_commit')})")
+    for r in current['results']:
+        old = baseline.get((r['stage'], r['rows']))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+        flag = '⚠️ ' if ratio > 1.2 else ''
+        print(f"{flag}{r['stage']:<20} {r['rows']:>9} righe: {old['seconds']:.3f}s → {r['seconds']:.3f}s (x{ratio:.2f})")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline del diario del sonno.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Numero di righe da testare")
+    parser.add_argument('--clients', type=int, default=200, help="Numero di clienti sintetici (default: 200)")
+    parser.add_argument('--no-memory', action='store_true', help="Non misurare il picco di memoria (più veloce)")
+    parser.add_argument('--output', help="File JSON dei risultati (default: benchmarks/results/bench_<data>.json)")
+    parser.add_argument('--compare', help="File JSON di un'esecuzione precedente da confrontare")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': [],
+    }
+
+    for n_rows in args.sizes:
+        for r in bench_size(n_rows, args.clients, track_memory=not args.no_memory):
+            report['results'].append(r)
+            peak = f"{r['peak_memory_mb']:.1f} MB" if r['peak_memory_mb'] is not None else '-'
+            print(f"{r['stage']:<20} {r['rows']:>9} righe: {r['seconds']:.3f}s ({r['rows_per_sec']:,.0f} righe/s, picco {peak})")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
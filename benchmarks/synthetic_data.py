@@ -0,0 +1,113 @@
+"""Generatore di export sintetici del diario del sonno, con i formati "sporchi" reali.
+
+Le colonne seguono il layout atteso da SleepDataCleaner.clean_data (COLUMN_MAP).
+"""
+import numpy as np
+import pandas as pd
+
+# Intestazioni dell'export Microsoft Forms (posizioni 0-13)
+EXPORT_COLUMNS = [
+    'ID',
+    'Start time',
+    'Completion time',
+    'Email',
+    'Name',
+    'Last modified time',
+    'Inserisci il tuo Nome e Cognome',
+    'A che ora sei andato a letto?',
+    'A che ora hai spento la luce?',
+    'Quanto tempo hai impiegato ad addormentarti? (minuti)',
+    'Quante volte ti sei svegliato?',
+    'Quanto tempo sei rimasto sveglio durante la notte? (minuti)',
+    'A che ora ti sei svegliato definitivamente?',
+    'A che ora ti sei alzato dal letto?',
+]
+
+TIME_TEXTS = ['Non ricordo', 'Non ho dormito', 'Sul divano', 'Penso verso le 23']
+DURATION_TEXTS = ['Non ricordo', 'non saprei', 'nessuna', 'Non ho dormito', 'quasi tutta la notte', 'secondi']
+
+def _pad(values):
+    return pd.Series(values).astype(str).str.zfill(2)
+
+def format_times(minutes, rng, dirty_fraction=0.3):
+    """Formatta minuti dalla mezzanotte come stringhe, con una quota di formati sporchi."""
+    n = len(minutes)
+    hours = minutes // 60
+    mins = minutes % 60
+    hh, mm = _pad(hours), _pad(mins)
+
+    out = (hh + ':' + mm).to_numpy(dtype=object)
+    kind = rng.choice(9, size=n, p=[0.55, 0.08, 0.06, 0.06, 0.05, 0.05, 0.05, 0.05, 0.05])
+    kind = np.where(rng.random(n) < dirty_fraction, kind, 0)
+
+    out[kind == 1] = (hh + ',' + mm)[kind == 1]               # 23,00
+    out[kind == 2] = (hh + ';' + mm)[kind == 2]               # 23;00
+    out[kind == 3] = (hh + '.' + mm)[kind == 3]               # 23.00
+    after_midnight = (kind == 4) & (hours < 6)
+    out[after_midnight] = (_pad(hours + 24) + ':' + mm)[after_midnight]  # 24:30
+    out[kind == 5] = hh.str.lstrip('0').replace('', '0')[kind == 5]      # 22
+    typo = (kind == 6) & (hours >= 20)
+    out[typo] = ('2' + hh + ';' + mm)[typo]                   # 223;15
+    out[kind == 7] = (hh + ':' + mm + '/' + _pad((hours + 1) % 24) + ':' + mm)[kind == 7]  # 10:40/11:40
+    texts = kind == 8
+    out[texts] = rng.choice(TIME_TEXTS, size=texts.sum())
+    return out
+
+def format_durations(minutes, rng, dirty_fraction=0.3):
+    """Formatta durate in minuti come stringhe, con una quota di formati sporchi."""
+    n = len(minutes)
+    values = pd.Series(minutes).astype(str)
+
+    out = values.to_numpy(dtype=object)
+    kind = rng.choice(6, size=n, p=[0.5, 0.15, 0.1, 0.1, 0.05, 0.1])
+    kind = np.where(rng.random(n) < dirty_fraction, kind, 0)
+
+    out[kind == 1] = (values + ' min')[kind == 1]                                    # 15 min
+    out[kind == 2] = (values + '/' + (pd.Series(minutes) + 5).astype(str))[kind == 2]  # 10/15
+    out[kind == 3] = ('00:' + _pad(np.minimum(minutes, 59)))[kind == 3]              # 00:15
+    out[kind == 4] = (_pad(np.minimum(minutes // 60 + 2, 23)) + ':00')[kind == 4]    # 02:00 (outlier)
+    texts = kind == 5
+    out[texts] = rng.choice(DURATION_TEXTS, size=texts.sum())
+    return out
+
+def generate_diary(n_rows, n_clients=50, seed=0, dirty_fraction=0.3, start='2023-01-01'):
+    """Genera un export sintetico di n_rows notti distribuite su n_clients clienti."""
+    rng = np.random.default_rng(seed)
+
+    clients = np.array([f'cliente {i:05d}' for i in range(n_clients)], dtype=object)
+    names = clients[rng.integers(0, n_clients, n_rows)]
+    # Varianti di scrittura del nome (maiuscole, spazi) e qualche nome mancante
+    variant = rng.random(n_rows)
+    names = np.where(variant < 0.1, pd.Series(names).str.upper().to_numpy(dtype=object), names)
+    names = np.where((variant >= 0.1) & (variant < 0.15), pd.Series(names).radd('  ').to_numpy(dtype=object), names)
+    names[rng.random(n_rows) < 0.01] = None
+
+    days = np.sort(rng.integers(0, max(n_rows // max(n_clients, 1), 1) + 30, n_rows))
+    start_time = pd.Timestamp(start) + pd.to_timedelta(days, unit='D') + pd.to_timedelta(rng.integers(6 * 3600, 12 * 3600, n_rows), unit='s')
+
+    # Orari coerenti: letto ~23:00, luci spente dopo 0-40 min, sveglia ~7:00, alzato dopo 0-45 min
+    bed = (23 * 60 + rng.normal(0, 60, n_rows).astype(int)) % 1440
+    lights = (bed + rng.integers(0, 40, n_rows)) % 1440
+    wake = (7 * 60 + rng.normal(0, 50, n_rows).astype(int)) % 1440
+    up = (wake + rng.integers(0, 45, n_rows)) % 1440
+
+    latency = rng.choice([5, 10, 15, 20, 30, 45, 60, 150], size=n_rows)
+    waso = rng.choice([0, 5, 10, 20, 30, 60, 90, 180], size=n_rows)
+
+    data = {
+        EXPORT_COLUMNS[0]: np.arange(1, n_rows + 1),
+        EXPORT_COLUMNS[1]: start_time,
+        EXPORT_COLUMNS[2]: start_time + pd.to_timedelta(rng.integers(30, 600, n_rows), unit='s'),
+        EXPORT_COLUMNS[3]: 'anonymous',
+        EXPORT_COLUMNS[4]: None,
+        EXPORT_COLUMNS[5]: None,
+        EXPORT_COLUMNS[6]: names,
+        EXPORT_COLUMNS[7]: format_times(bed, rng, dirty_fraction),
+        EXPORT_COLUMNS[8]: format_times(lights, rng, dirty_fraction),
+        EXPORT_COLUMNS[9]: format_durations(latency, rng, dirty_fraction),
+        EXPORT_COLUMNS[10]: rng.integers(0, 6, n_rows),
+        EXPORT_COLUMNS[11]: format_durations(waso, rng, dirty_fraction),
+        EXPORT_COLUMNS[12]: format_times(wake, rng, dirty_fraction),
+        EXPORT_COLUMNS[13]: format_times(up, rng, dirty_fraction),
+    }
+    return pd.DataFrame(data)
@@ -0,0 +1,38 @@
+"""Analisi dei diari del sonno: pulizia, metriche, archivio ed export.
+
+Le classi principali sono importabili dal pacchetto, ma i moduli (e pandas)
+sono caricati solo al primo accesso: `import sleep_analyzer` è immediato.
+"""
+import importlib
+
+# Nome pubblico → modulo che lo definisce
+_EXPORTS = {
+    'SleepDataCleaner': 'data_cleaner',
+    'COLUMN_MAP': 'data_cleaner',
+    'SleepCalculator': 'sleep_calculator',
+    'DiaryLoader': 'data_loader',
+    'content_hash': 'data_loader',
+    'SleepStateStore': 'sleep_store',
+    'ClientIndex': 'client_index',
+    'ALL_CLIENTS': 'client_index',
+    'StageProfiler': 'profiling',
+    'enable_logging': 'profiling',
+    'export_bytes': 'exporter',
+    'StreamingExport': 'exporter',
+    'ChunkedPipeline': 'chunked_pipeline',
+    'AnalysisServer': 'api_server',
+    'AnalysisClient': 'api_server',
+    'JobManager': 'jobs',
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,431 @@
+"""Servizio HTTP locale per l'analisi del diario del sonno (senza Streamlit).
+
+Esempio:
+    python -m sleep_analyzer.api_server --port 8765 --workers 4
+
+Endpoint:
+    GET  /salute                     stato del servizio e della cache
+    POST /analisi?file=diario.xlsx   export caricato (corpo = contenuto del file)
+    POST /analisi                    JSON {"righe": [...]} (Content-Type: application/json)
+
+Parametri di /analisi: cliente=<nome> (riepilogo e notti di un solo cliente),
+righe=1 (include le notti elaborate nella risposta).
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import threading
+import http.client
+from datetime import date, datetime, time as dt_time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+import numpy as np
+import pandas as pd
+
+from .data_cleaner import SleepDataCleaner, COLUMN_MAP
+from .sleep_calculator import SleepCalculator
+from .data_loader import DiaryLoader, content_hash
+from .exporter import iter_rows, prepare_export
+from .client_index import ClientIndex, ALL_CLIENTS
+
+DEFAULT_PORT = 8765
+MAX_BODY_MB = 200
+CACHE_ENTRIES = 16
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class RequestError(Exception):
+    """Richiesta non valida: il messaggio è restituito al client con lo stato indicato."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        # Sollevata anche nei processi worker: deve tornare intatta al server
+        return RequestError, (self.status, str(self))
+
+# ==================== WORKER ====================
+
+def _warm_worker():
+    """Inizializza il processo worker: import e cache del parser già pronti alla prima richiesta."""
+    sample = pd.DataFrame({name: ['Mario Rossi' if name == 'nome_cliente' else '23:00'] for name in COLUMN_MAP})
+    sample['data_compilazione'] = pd.Timestamp('2024-01-01')
+    sample.attrs['col_map'] = {name: i for i, name in enumerate(COLUMN_MAP)}
+    SleepCalculator().process_dataframe(SleepDataCleaner().clean_data(sample))
+
+def _ping():
+    return True
+
+def records_frame(rows):
+    """Dataframe grezzo da righe JSON.
+
+    Righe come oggetti: chiavi di COLUMN_MAP (nome_cliente, ora_letto, ...).
+    Righe come liste: colonne nelle posizioni dell'export (come il file Excel).
+    """
+    if not isinstance(rows, list):
+        raise RequestError(400, "'righe' deve essere una lista")
+    if rows and all(isinstance(row, dict) for row in rows):
+        df = pd.DataFrame.from_records(rows, columns=list(COLUMN_MAP))
+        df.attrs['col_map'] = {name: i for i, name in enumerate(COLUMN_MAP)}
+        return df
+    if all(isinstance(row, list) for row in rows):
+        df = pd.DataFrame(rows)
+        missing = max(COLUMN_MAP.values()) + 1 - df.shape[1]
+        if missing > 0:
+            raise RequestError(400, f"Righe con {df.shape[1]} colonne: ne servono almeno {df.shape[1] + missing}")
+        return df
+    raise RequestError(400, "Le righe devono essere tutte oggetti o tutte liste")
+
+def analyze_frame(df):
+    """Pulizia e metriche di tutti i clienti, come nell'app. Restituisce (righe lette, indice)."""
+    n_rows = len(df)
+    df = SleepDataCleaner().clean_data(df)
+    df = df[df['nome_cliente_normalizzato'].notna()]
+    if 'data_compilazione' in df.columns:
+        df = df.sort_values('data_compilazione', ascending=True).reset_index(drop=True)
+    df_results = SleepCalculator().process_dataframe(df)
+    return n_rows, ClientIndex(df_results)
+
+def analyze_upload(data, filename):
+    """Analisi di un export caricato (eseguita nel processo worker)."""
+    try:
+        df = DiaryLoader().load(data, filename=filename)
+    except Exception as e:
+        raise RequestError(400, f"File non leggibile: {type(e).__name__}: {e}")
+    return analyze_frame(df)
+
+def analyze_records(body):
+    """Analisi di righe JSON (eseguita nel processo worker)."""
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise RequestError(400, f"JSON non valido: {e}")
+    rows = payload.get('righe') if isinstance(payload, dict) else payload
+    return analyze_frame(records_frame(rows))
+
+# ==================== SERIALIZZAZIONE ====================
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dt_time):
+        return value.strftime('%H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _finite(value):
+    """NaN → None (JSON non ammette NaN)."""
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        return None
+    return value
+
+def summary_json(summary):
+    return {
+        'notti': summary['notti'],
+        'notti_valide': summary['notti_valide'],
+        'notti_ultime': summary['notti_ultime'],
+        'media': {col: _finite(v) for col, v in summary['media'].items()},
+        'media_ultime': {col: _finite(v) for col, v in summary['media_ultime'].items()},
+        'qualita': summary['qualita'],
+    }
+
+def rows_json(df):
+    """Notti elaborate come oggetti JSON (orari in HH:MM, date ISO, None per i mancanti)."""
+    df = prepare_export(df)
+    columns = [str(c) for c in df.columns]
+    return [{col: _finite(v) for col, v in zip(columns, row)} for row in iter_rows(df)]
+
+def build_response(file_hash, n_rows, index, client=None, include_rows=False):
+    """Corpo JSON della risposta di /analisi."""
+    client = client or ALL_CLIENTS
+    if client != ALL_CLIENTS and client not in index.clients:
+        raise RequestError(404, f"Cliente non trovato: {client}")
+
+    response = {
+        'hash': file_hash,
+        'righe_lette': n_rows,
+        'notti': len(index),
+        'clienti': index.clients,
+        'cliente': client,
+        'riepilogo': summary_json(index.summary(client)),
+    }
+    if client == ALL_CLIENTS:
+        response['riepilogo_clienti'] = [
+            {col: _finite(v) for col, v in record.items()} for record in index.overview().to_dict('records')
+        ]
+    if include_rows:
+        response['risultati'] = rows_json(index.rows(client))
+    return json.dumps(response, default=_json_default, ensure_ascii=False).encode('utf-8')
+
+# ==================== SERVER ====================
+
+class AnalysisServer:
+    """Server HTTP asyncio con un pool di processi worker già avviati.
+
+    I risultati sono in cache per hash SHA-256 del contenuto (come nell'app) e
+    formato (estensione del file o JSON): un export già analizzato, o in
+    analisi per un'altra richiesta, non viene ricalcolato. Le richieste concorrenti sono servite dal pool in parallelo.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, workers=None,
+                 cache_entries=CACHE_ENTRIES, max_body_mb=MAX_BODY_MB):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_entries = cache_entries
+        self.max_body = int(max_body_mb * 1024 ** 2)
+        self.executor = None
+        self.server = None
+        self._cache = OrderedDict()
+        self._pending = {}
+        self.stats = {'richieste': 0, 'cache_hit': 0, 'analisi': 0}
+
+    async def start(self):
+        """Avvia il pool (un processo per worker, già inizializzato) e il server."""
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)
+        ))
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def analyze(self, key, func, *args):
+        """Risultato in cache per chiave (hash e formato), altrimenti calcolato nel pool (una sola volta per chiave)."""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats['cache_hit'] += 1
+            return self._cache[key], True
+
+        if key in self._pending:
+            self.stats['cache_hit'] += 1
+            return await asyncio.shield(self._pending[key]), True
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, func, *args)
+        self._pending[key] = future
+        try:
+            result = await future
+        finally:
+            del self._pending[key]
+
+        self.stats['analisi'] += 1
+        self._cache[key] = result
+        if len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+        return result, False
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                status, body = await self._dispatch(reader)
+            except RequestError as e:
+                status, body = e.status, json.dumps({'errore': str(e)}, ensure_ascii=False).encode('utf-8')
+            except Exception as e:
+                status, body = 500, json.dumps({'errore': f"{type(e).__name__}: {e}"}, ensure_ascii=False).encode('utf-8')
+
+            head = (
+                f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            raise RequestError(400, "Intestazione HTTP non valida")
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise RequestError(400, "Riga di richiesta non valida")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.stats['richieste'] += 1
+
+        if url.path == '/salute':
+            if method != 'GET':
+                raise RequestError(405, "Usa GET")
+            body = {'stato': 'ok', 'worker': self.workers, 'cache': len(self._cache), **self.stats}
+            return 200, json.dumps(body).encode('utf-8')
+
+        if url.path != '/analisi':
+            raise RequestError(404, f"Endpoint sconosciuto: {url.path}")
+        if method != 'POST':
+            raise RequestError(405, "Usa POST")
+
+        if 'content-length' not in headers:
+            raise RequestError(411, "Intestazione Content-Length mancante")
+        try:
+            length = int(headers['content-length'])
+        except ValueError:
+            raise RequestError(400, "Content-Length non valido")
+        if length < 0:
+            raise RequestError(400, "Content-Length non valido")
+        if length > self.max_body:
+            raise RequestError(413, f"File troppo grande (massimo {self.max_body // 1024 ** 2} MB)")
+        if length == 0:
+            raise RequestError(400, "Corpo della richiesta vuoto")
+        try:
+            data = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise RequestError(400, "Content-Length non valido")
+
+        file_hash = content_hash(data)
+        if headers.get('content-type', '').startswith('application/json'):
+            (n_rows, index), cached = await self.analyze((file_hash, 'json'), analyze_records, data)
+        else:
+            filename = query.get('file') or headers.get('x-filename') or 'diario.xlsx'
+            # L'estensione sceglie il lettore: gli stessi byte con un'altra estensione sono un'altra analisi
+            extension = os.path.splitext(filename)[1].lower()
+            (n_rows, index), cached = await self.analyze((file_hash, extension), analyze_upload, data, filename)
+
+        # Serializzazione in un thread: il ciclo asyncio resta libero per le altre richieste
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(
+            None, build_response, file_hash, n_rows, index, query.get('cliente'), query.get('righe') == '1'
+        )
+        return 200, body
+
+    def start_background(self):
+        """Avvia il server in un thread (uso locale e test); restituisce il server avviato."""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            self._loop = loop
+            try:
+                loop.run_until_complete(self.start())
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name='analysis-server', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop_background(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+# ==================== CLIENT ====================
+
+class AnalysisClient:
+    """Client del servizio di analisi (solo libreria standard, nessuna rete esterna)."""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=300):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, headers=None, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        if params:
+            path += '?' + urlencode(params)
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            payload = json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"{response.status}: {payload.get('errore')}")
+        return payload
+
+    def health(self):
+        return self._request('GET', '/salute')
+
+    def analyze_file(self, path, client=None, rows=False):
+        """Analizza un export (xlsx, xls, csv, parquet)."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.analyze_bytes(data, str(path), client=client, rows=rows)
+
+    def analyze_bytes(self, data, filename, client=None, rows=False):
+        return self._request(
+            'POST', '/analisi', body=data, headers={'Content-Type': 'application/octet-stream'},
+            file=filename, cliente=client, righe='1' if rows else None
+        )
+
+    def analyze_records(self, records, client=None, rows=False):
+        """Analizza righe JSON (oggetti con le chiavi di COLUMN_MAP o liste nel layout dell'export)."""
+        body = json.dumps({'righe': records}, default=_json_default).encode('utf-8')
+        return self._request(
+            'POST', '/analisi', body=body, headers={'Content-Type': 'application/json'},
+            cliente=client, righe='1' if rows else None
+        )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale di analisi del diario del sonno.")
+    parser.add_argument('--host', default='127.0.0.1', help="Indirizzo di ascolto (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Porta (default: {DEFAULT_PORT})")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Processi worker (default: numero di CPU)")
+    parser.add_argument('--cache', type=int, default=CACHE_ENTRIES, help=f"Analisi tenute in cache (default: {CACHE_ENTRIES})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = AnalysisServer(args.host, args.port, workers=args.workers, cache_entries=args.cache)
+
+    async def run():
+        await server.start()
+        print(f"🚀 Servizio di analisi su http://{server.host}:{server.port} ({server.workers} worker)")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Elaborazione batch (senza interfaccia) di una cartella di export del diario del sonno.
+
+Esempio:
+    python -m sleep_analyzer.batch export/ --output risultati/ --workers 4
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .data_cleaner import SleepDataCleaner
+from .sleep_calculator import SleepCalculator
+from .data_loader import DiaryLoader, EXCEL_EXTENSIONS, LEGACY_EXCEL_EXTENSIONS, CSV_EXTENSIONS, PARQUET_EXTENSIONS
+from .exporter import available_formats, export_bytes
+
+INPUT_EXTENSIONS = EXCEL_EXTENSIONS + LEGACY_EXCEL_EXTENSIONS + CSV_EXTENSIONS + PARQUET_EXTENSIONS
+OUTPUT_FORMATS = tuple(available_formats())
+
+def find_input_files(input_dir, extensions=INPUT_EXTENSIONS):
+    """File di export presenti nella cartella (ordinati, esclusi i file temporanei di Excel)."""
+    files = []
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        if name.startswith('~$') or not os.path.isfile(path):
+            continue
+        if os.path.splitext(name)[1].lower() in extensions:
+            files.append(path)
+    return files
+
+def write_results(df, path, output_format):
+    """Scrive i risultati nel formato richiesto."""
+    with open(path, 'wb') as f:
+        f.write(export_bytes(df, output_format))
+
+def process_file(path, output_dir, output_format='xlsx'):
+    """Legge, pulisce e calcola un singolo file; non solleva eccezioni.
+
+    Restituisce (riepilogo, dataframe dei risultati o None).
+    """
+    start = time.perf_counter()
+    summary = {'file': os.path.basename(path), 'stato': 'ok', 'righe': 0, 'notti': 0, 'clienti': 0}
+
+    try:
+        df = DiaryLoader().load(path)
+        summary['righe'] = len(df)
+
+        df = SleepDataCleaner().clean_data(df)
+        df = df[df['nome_cliente_normalizzato'].notna()]
+
+        df_results = SleepCalculator().process_dataframe(df)
+        summary['notti'] = len(df_results)
+        summary['clienti'] = df_results['nome_cliente_normalizzato'].nunique()
+
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, f"risultati_{base_name}.{output_format}")
+        write_results(df_results, output_path, output_format)
+        summary['output'] = output_path
+    except Exception as e:
+        summary['stato'] = 'errore'
+        summary['errore'] = f"{type(e).__name__}: {e}"
+        summary['traceback'] = traceback.format_exc()
+        df_results = None
+
+    summary['secondi'] = round(time.perf_counter() - start, 3)
+    return summary, df_results
+
+def run_batch(input_files, output_dir, workers=None, output_format='xlsx', combined=True, log=print):
+    """Elabora i file in parallelo; un errore su un file non interrompe gli altri.
+
+    Restituisce la lista dei riepiloghi per file (nell'ordine dei file di input).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    summaries = {}
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_file, path, output_dir, output_format): path
+            for path in input_files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary, df_results = future.result()
+            except Exception as e:
+                # Il processo worker è morto (es. memoria esaurita)
+                summary = {'file': os.path.basename(path), 'stato': 'errore', 'errore': f"{type(e).__name__}: {e}"}
+                df_results = None
+
+            summaries[path] = summary
+            if df_results is not None:
+                results[path] = df_results
+
+            if summary['stato'] == 'ok':
+                log(f"✅ {summary['file']}: {summary['notti']} notti, {summary['clienti']} clienti ({summary['secondi']}s)")
+            else:
+                log(f"❌ {summary['file']}: {summary['errore']}")
+
+    ordered = [summaries[path] for path in input_files]
+
+    if combined and results:
+        df_all = pd.concat(
+            [df.assign(file_origine=os.path.basename(path)) for path, df in results.items()],
+            ignore_index=True
+        )
+        combined_path = os.path.join(output_dir, f"risultati_tutti_file.{output_format}")
+        write_results(df_all, combined_path, output_format)
+        log(f"📦 Risultati combinati: {combined_path} ({len(df_all)} notti)")
+
+    summary_df = pd.DataFrame(ordered).drop(columns='traceback', errors='ignore')
+    summary_df.to_csv(os.path.join(output_dir, 'riepilogo_batch.csv'), index=False)
+
+    return ordered
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Elabora in batch gli export del diario del sonno.")
+    parser.add_argument('input_dir', help="Cartella con i file da elaborare (xlsx, xls, csv, parquet)")
+    parser.add_argument('-o', '--output', default='risultati_batch', help="Cartella di output (default: risultati_batch)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Numero di processi (default: numero di CPU)")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='xlsx', help="Formato dei risultati (default: xlsx)")
+    parser.add_argument('--no-combined', action='store_true', help="Non scrivere il file combinato")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    input_files = find_input_files(args.input_dir)
+    if not input_files:
+        print(f"Nessun file da elaborare in {args.input_dir}")
+        return 1
+
+    print(f"🚀 Elaborazione di {len(input_files)} file...")
+    summaries = run_batch(
+        input_files, args.output,
+        workers=args.workers, output_format=args.format, combined=not args.no_combined
+    )
+
+    failed = [s for s in summaries if s['stato'] != 'ok']
+    print(f"Completati: {len(summaries) - len(failed)}, errori: {len(failed)}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
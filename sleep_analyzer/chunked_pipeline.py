@@ -0,0 +1,213 @@
+"""Elaborazione a blocchi (out-of-core) di export molto grandi.
+
+Esempio:
+    python -m sleep_analyzer.chunked_pipeline diario_10anni.csv -o risultati.parquet --chunk-rows 100000
+"""
+import os
+import sys
+import time
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .data_cleaner import SleepDataCleaner
+from .sleep_calculator import SleepCalculator, ROLLING_COLUMNS
+from .data_loader import DiaryLoader, DEFAULT_CHUNK_ROWS, peak_rss_mb
+from .exporter import StreamingExport, STREAMING_FORMATS
+from .profiling import NULL_PROFILER
+
+ROLLING_WINDOW = 7
+
+# Ritardo massimo (giorni) di una notte rispetto alla più recente già letta: l'export
+# di Forms è in ordine di invio, non di Start time, quindi le date non sono monotone
+MAX_DELAY_DAYS = 2
+
+class ChunkedPipeline:
+    """Legge, pulisce e calcola un export a blocchi di chunk_rows righe.
+
+    Le notti non sono scritte appena lette: restano in attesa finché la notte
+    più recente letta non le supera di max_delay_days giorni, così quelle
+    arrivate in ritardo (l'export segue l'ordine di invio, non lo Start time)
+    vengono prima ordinate al loro posto. Le notti senza data restano in attesa
+    fino alla fine del file, dove le mette anche process_dataframe.
+
+    Per le medie rolling si conservano tra un blocco e l'altro solo le ultime
+    6 notti già scritte di ogni cliente: la memoria dipende dalla dimensione del
+    blocco, dal ritardo ammesso e dal numero di clienti, non dalla lunghezza del
+    file. Con ritardi entro max_delay_days il risultato è quello di
+    process_dataframe sul file intero; una notte più vecchia dell'ultima già
+    scritta del suo cliente non può più entrare nelle medie già scritte: viene
+    contata in late_rows e segnalata con un RuntimeWarning.
+    """
+
+    def __init__(self, chunk_rows=DEFAULT_CHUNK_ROWS, loader=None, cleaner=None, calculator=None, profiler=None,
+                 max_delay_days=MAX_DELAY_DAYS):
+        self.chunk_rows = chunk_rows
+        self.max_delay = pd.Timedelta(days=max_delay_days)
+        self.profiler = profiler or NULL_PROFILER
+        self.loader = loader or DiaryLoader(profiler=self.profiler)
+        self.cleaner = cleaner or SleepDataCleaner(profiler=self.profiler)
+        self.calculator = calculator or SleepCalculator(profiler=self.profiler)
+        self.reset()
+
+    def reset(self):
+        """Riparte da zero (nuovo file)."""
+        # Contesto: ultime (window - 1) notti già scritte di ogni cliente
+        self._carry = None
+        # Notti lette ma non ancora scritte
+        self._pending = None
+        self._newest = pd.NaT
+        # Cliente → data dell'ultima notte scritta
+        self._last_written = pd.Series(dtype='datetime64[ns]')
+        self.late_rows = 0
+
+    def iter_results(self, source, filename=None):
+        """Risultati blocco per blocco (notti con nome cliente, ordinate per data nel blocco).
+
+        L'ultimo elemento ha un blocco grezzo vuoto: sono le notti rimaste in attesa (flush).
+        """
+        self.reset()
+        df_raw = None
+        for df_raw in self.loader.iter_chunks(source, filename=filename, chunk_rows=self.chunk_rows):
+            with self.profiler.stage('blocco', rows=len(df_raw)):
+                yield df_raw, self.process_chunk(df_raw)
+        if df_raw is not None:
+            with self.profiler.stage('blocco_finale'):
+                yield df_raw.iloc[:0], self.flush()
+
+    def process_chunk(self, df_raw):
+        """Pulisce e calcola un blocco; restituisce le notti pronte per la scrittura (anche di blocchi precedenti)."""
+        df = self.cleaner.clean_data(df_raw)
+        df = df[df['nome_cliente_normalizzato'].notna()].reset_index(drop=True)
+
+        metrics_df = self.calculator.calculate_metrics_vectorized(df)
+        for col in metrics_df.columns:
+            df[col] = metrics_df[col]
+        df['nome_cliente_normalizzato'] = df['nome_cliente_normalizzato'].astype(object)
+
+        self._check_late(df)
+        self._pending = df if self._pending is None else pd.concat([self._pending, df], ignore_index=True)
+        newest = df['data_compilazione'].max()
+        if pd.notna(newest) and not (newest <= self._newest):
+            self._newest = newest
+
+        # Pronte: notti più vecchie di max_delay rispetto alla più recente letta (NaT restano in attesa)
+        ready = (self._pending['data_compilazione'] < self._newest - self.max_delay).to_numpy()
+        return self._emit(ready)
+
+    def flush(self):
+        """Notti ancora in attesa a fine file (comprese quelle senza data, in fondo)."""
+        if self._pending is None:
+            return None
+        return self._emit(np.ones(len(self._pending), dtype=bool))
+
+    def _check_late(self, df):
+        """Conta e segnala le notti più vecchie dell'ultima già scritta del loro cliente."""
+        if self._last_written.empty:
+            return
+        last = df['nome_cliente_normalizzato'].map(self._last_written)
+        late = int((df['data_compilazione'] < last).sum())
+        if late:
+            self.late_rows += late
+            warnings.warn(
+                f"{late} notti arrivate con più di {self.max_delay.days} giorni di ritardo: "
+                "le medie rolling già scritte non le includono (aumenta max_delay_days)",
+                RuntimeWarning, stacklevel=3
+            )
+
+    def _emit(self, ready):
+        """Calcola le medie rolling delle notti in attesa e restituisce quelle pronte (ready)."""
+        pending = self._pending
+        n_carry = 0 if self._carry is None else len(self._carry)
+        combined = pd.concat([self._carry, pending], ignore_index=True) if n_carry else pending
+
+        # Contesto prima delle notti in attesa a parità di data; notti senza data in fondo
+        is_pending = np.r_[np.zeros(n_carry, dtype=bool), np.ones(len(pending), dtype=bool)]
+        is_ready = np.r_[np.zeros(n_carry, dtype=bool), ready]
+        order = combined['data_compilazione'].reset_index(drop=True).sort_values(
+            kind='stable', na_position='last').index.to_numpy()
+        combined = combined.take(order).reset_index(drop=True)
+        is_pending, is_ready = is_pending[order], is_ready[order]
+
+        rolling_df = self.calculator.calculate_rolling_averages(combined, window=ROLLING_WINDOW)
+        for col in rolling_df.columns:
+            combined[col] = rolling_df[col]
+
+        written = combined[is_ready].reset_index(drop=True)
+        self._pending = combined[is_pending & ~is_ready].drop(columns=list(ROLLING_COLUMNS)).reset_index(drop=True)
+
+        # Nuovo contesto: le ultime (window - 1) notti scritte (con data) di ogni cliente
+        context = combined[~is_pending | is_ready]
+        context = context[context['data_compilazione'].notna()]
+        self._carry = context.groupby('nome_cliente_normalizzato', sort=False).tail(ROLLING_WINDOW - 1)
+        self._carry = self._carry.drop(columns=list(ROLLING_COLUMNS)).reset_index(drop=True)
+
+        last = written.groupby('nome_cliente_normalizzato', sort=False)['data_compilazione'].max().dropna()
+        self._last_written = pd.concat([self._last_written, last]).groupby(level=0).max()
+
+        return written
+
+    def run(self, source, output_path, fmt=None, filename=None, log=None):
+        """Elabora il file e scrive i risultati a blocchi in output_path (csv o parquet).
+
+        Restituisce un riepilogo (righe lette, notti scritte, blocchi, clienti, tempo, memoria).
+        """
+        fmt = fmt or os.path.splitext(output_path)[1].lstrip('.').lower()
+        start = time.perf_counter()
+        summary = {'righe': 0, 'notti': 0, 'blocchi': 0}
+        clients = set()
+
+        writer = None
+        try:
+            for df_raw, df_results in self.iter_results(source, filename=filename):
+                if writer is None:
+                    writer = StreamingExport(output_path, fmt, raw_columns=list(df_raw.columns))
+                with self.profiler.stage('scrittura', rows=len(df_results)):
+                    writer.write(df_results)
+
+                summary['righe'] += len(df_raw)
+                summary['notti'] += len(df_results)
+                clients.update(df_results['nome_cliente_normalizzato'].astype(object).unique())
+                if not len(df_raw):
+                    continue  # notti rimaste in attesa a fine file
+                summary['blocchi'] += 1
+                if log:
+                    log(f"📦 Blocco {summary['blocchi']}: {summary['righe']} righe lette, {summary['notti']} notti scritte")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        summary['clienti'] = len(clients)
+        summary['notti_in_ritardo'] = self.late_rows
+        summary['secondi'] = round(time.perf_counter() - start, 3)
+        summary['picco_memoria_mb'] = peak_rss_mb()
+        return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Elabora a blocchi un export molto grande del diario del sonno.")
+    parser.add_argument('input', help="File da elaborare (csv, parquet, xlsx; .xls viene letto intero)")
+    parser.add_argument('-o', '--output', required=True, help="File dei risultati (.csv o .parquet)")
+    parser.add_argument('-c', '--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Righe per blocco (default: {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('-f', '--format', choices=STREAMING_FORMATS, default=None,
+                        help="Formato dei risultati (default: dall'estensione del file di output)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in STREAMING_FORMATS:
+        print(f"Formato di output non supportato: {fmt} (usa {', '.join(STREAMING_FORMATS)})")
+        return 1
+
+    pipeline = ChunkedPipeline(chunk_rows=args.chunk_rows)
+    summary = pipeline.run(args.input, args.output, fmt=fmt, log=print)
+    peak = f", picco memoria {summary['picco_memoria_mb']:.0f} MB" if summary['picco_memoria_mb'] else ''
+    print(f"✅ {summary['notti']} notti di {summary['clienti']} clienti scritte in {args.output} "
+          f"({summary['secondi']}s{peak})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
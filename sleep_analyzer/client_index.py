@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+from .quality import quality_counts
+from .cohort import cohort_statistics
+from .sleep_calculator import SleepCalculator
+
+ALL_CLIENTS = "Tutti i clienti"
+
+# Metriche riassunte per cliente (medie globali e delle ultime notti valide)
+SUMMARY_COLUMNS = [
+    'tempo_totale_a_letto_ore',
+    'durata_sonno_ore',
+    'efficienza_sonno',
+    'latenza_minuti',
+    'veglia_infrasonno_minuti',
+]
+
+def factorize_clients(names):
+    """Codici dei clienti in ordine alfabetico (-1 se il nome manca)."""
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        names = names.cat.remove_unused_categories()
+        names = names.cat.reorder_categories(sorted(names.cat.categories))
+        return names.cat.codes.to_numpy(), [str(c) for c in names.cat.categories]
+    codes, uniques = pd.factorize(names, sort=True)
+    return codes, [str(c) for c in uniques]
+
+class ClientIndex:
+    """Indice per cliente dei risultati di SleepCalculator.process_dataframe.
+
+    I risultati sono riordinati per cliente (mantenendo l'ordine cronologico di
+    ciascuno): le notti di un cliente sono un intervallo contiguo del
+    dataframe, individuato da offset precalcolati. Conteggi e medie (globali e
+    delle ultime `last_n` notti valide) sono calcolati una volta per tutti i
+    clienti, così selezione e schede metriche sono semplici letture.
+    """
+
+    def __init__(self, df_results, client_col='nome_cliente_normalizzato', last_n=7):
+        self.client_col = client_col
+        self.last_n = last_n
+
+        codes, clients = factorize_clients(df_results[client_col])
+        self.clients = clients
+
+        # Ordine per cliente, stabile: dentro ogni cliente resta l'ordine per data
+        kept = np.flatnonzero(codes >= 0)
+        order = kept[np.argsort(codes[kept], kind='stable')]
+        self.frame = df_results.take(order).reset_index(drop=True)
+        self._date_order = np.argsort(order, kind='stable')
+
+        counts = np.bincount(codes[kept], minlength=len(clients))
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        self._offsets = {client: (bounds[i], bounds[i + 1]) for i, client in enumerate(self.clients)}
+
+        self._group = np.repeat(np.arange(len(clients)), counts)
+        self._summaries = self._build_summaries(self._group, counts)
+        self._cohort = None
+        self._regularity = None
+
+    def _valid_mask(self, df):
+        return (df['tempo_totale_a_letto_ore'].notna() & df['durata_sonno_ore'].notna()).to_numpy()
+
+    def _build_summaries(self, group, counts):
+        """Conteggi e medie per cliente (e per tutti i clienti) in un solo passaggio vettoriale."""
+        k = len(self.clients)
+        valid = self._valid_mask(self.frame)
+        valid_positions = np.flatnonzero(valid)
+        valid_group = group[valid_positions]
+
+        # Ultime `last_n` notti valide di ciascun cliente: posizione contata dalla fine del gruppo
+        valid_counts = np.bincount(valid_group, minlength=k)
+        rank_from_end = np.cumsum(valid_counts)[valid_group] - np.arange(len(valid_group))
+        last_positions = valid_positions[rank_from_end <= self.last_n]
+
+        # Tutti i clienti: ultime notti valide in ordine di data
+        valid_by_date = self._date_order[valid[self._date_order]]
+        all_last_positions = valid_by_date[-self.last_n:] if self.last_n else valid_by_date[:0]
+
+        means = {}
+        means_last = {}
+        for col in SUMMARY_COLUMNS:
+            if col in self.frame.columns:
+                values = pd.to_numeric(self.frame[col], errors='coerce').to_numpy(dtype='float64')
+            else:
+                values = np.full(len(self.frame), np.nan)
+            means[col] = self._group_means(values, valid_positions, group, k)
+            means_last[col] = self._group_means(values, last_positions, group, k)
+            means[col]['__all__'] = np.nanmean(values[valid_positions]) if len(valid_positions) else np.nan
+            means_last[col]['__all__'] = np.nanmean(values[all_last_positions]) if len(all_last_positions) else np.nan
+
+        last_counts = np.bincount(group[last_positions], minlength=k)
+
+        # Conteggi di qualità (valori scartati o corretti) per cliente, dagli esiti già calcolati
+        quality = quality_counts(self.frame, group, k)
+
+        summaries = {}
+        for i, client in enumerate(self.clients):
+            summaries[client] = {
+                'notti': int(counts[i]),
+                'notti_valide': int(valid_counts[i]),
+                'notti_ultime': int(last_counts[i]),
+                'media': {col: means[col][i] for col in SUMMARY_COLUMNS},
+                'media_ultime': {col: means_last[col][i] for col in SUMMARY_COLUMNS},
+                'qualita': {label: int(counts[i]) for label, counts in quality.items()},
+            }
+        summaries[ALL_CLIENTS] = {
+            'notti': len(self.frame),
+            'notti_valide': len(valid_positions),
+            'notti_ultime': len(all_last_positions),
+            'media': {col: means[col]['__all__'] for col in SUMMARY_COLUMNS},
+            'media_ultime': {col: means_last[col]['__all__'] for col in SUMMARY_COLUMNS},
+            'qualita': {label: int(counts.sum()) for label, counts in quality.items()},
+        }
+        return summaries
+
+    @staticmethod
+    def _group_means(values, positions, group, k):
+        """Medie per gruppo dei valori nelle posizioni indicate (NaN esclusi)."""
+        selected = values[positions]
+        finite = ~np.isnan(selected)
+        g = group[positions][finite]
+        sums = np.bincount(g, weights=selected[finite], minlength=k)
+        counts = np.bincount(g, minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        return dict(enumerate(means))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def count(self, client=ALL_CLIENTS):
+        """Numero di notti del cliente."""
+        return self._summaries[client]['notti']
+
+    def rows(self, client=ALL_CLIENTS):
+        """Notti del cliente in ordine di data (tutti i clienti: ordine di data globale)."""
+        if client == ALL_CLIENTS:
+            return self.frame.take(self._date_order).reset_index(drop=True)
+        start, stop = self._offsets[client]
+        return self.frame.iloc[start:stop].reset_index(drop=True)
+
+    def summary(self, client=ALL_CLIENTS):
+        """Conteggi e medie precalcolate del cliente (o di tutti i clienti)."""
+        return self._summaries[client]
+
+    def cohort(self):
+        """Statistiche di coorte di tutti i clienti (percentili, trend, z-score), calcolate al primo uso.
+
+        L'ultima riga (cliente ALL_CLIENTS) riporta percentili e trend di tutte le notti valide.
+        """
+        if self._cohort is None:
+            self._cohort = cohort_statistics(
+                self.frame, self._group, self.clients, self._valid_mask(self.frame),
+                client_col=self.client_col, cohort_label=ALL_CLIENTS
+            )
+        return self._cohort
+
+    def cohort_stats(self, client=ALL_CLIENTS):
+        """Statistiche di coorte di un cliente (o della coorte) come dizionario."""
+        position = len(self.clients) if client == ALL_CLIENTS else self.clients.index(client)
+        return self.cohort().iloc[position].to_dict()
+
+    def regularity(self):
+        """Metriche di regolarità degli orari di tutti i clienti (indice: cliente), calcolate al primo uso."""
+        if self._regularity is None:
+            table = SleepCalculator().calculate_regularity(self.frame, self.client_col)
+            self._regularity = table.set_index(self.client_col).reindex(self.clients)
+        return self._regularity
+
+    def overview(self):
+        """Tabella riassuntiva di tutti i clienti (senza ricalcoli)."""
+        records = []
+        for client in self.clients:
+            s = self._summaries[client]
+            record = {self.client_col: client, 'notti': s['notti'], 'notti_valide': s['notti_valide']}
+            record.update({f'media_{col}': s['media'][col] for col in SUMMARY_COLUMNS})
+            record.update({f'media_ultime_{col}': s['media_ultime'][col] for col in SUMMARY_COLUMNS})
+            record.update(s['qualita'])
+            records.append(record)
+        return pd.DataFrame(records)
@@ -0,0 +1,153 @@
+"""Statistiche di coorte: percentili, trend settimanale e z-score per cliente.
+
+Tutto è calcolato per gruppo con NumPy (ordinamenti e bincount), senza
+cicli sui clienti: il costo dipende dal numero di notti, non dei clienti.
+"""
+import numpy as np
+import pandas as pd
+
+# Metriche delle statistiche di coorte
+COHORT_COLUMNS = [
+    'durata_sonno_ore',
+    'efficienza_sonno',
+    'latenza_minuti',
+    'veglia_infrasonno_minuti',
+]
+
+PERCENTILES = (10, 50, 90)
+
+# Etichette delle metriche per l'interfaccia
+COHORT_LABELS = {
+    'durata_sonno_ore': 'TST (ore)',
+    'efficienza_sonno': 'Efficienza (%)',
+    'latenza_minuti': 'Latenza (min)',
+    'veglia_infrasonno_minuti': 'WASO (min)',
+}
+
+def _sorted_percentiles(values, starts, counts, percentiles):
+    """Percentili di segmenti ordinati di values (inizio e lunghezza di ogni segmento)."""
+    has_values = counts > 0
+    result = {}
+    for p in percentiles:
+        position = (counts - 1) * (p / 100)
+        lower = np.floor(position).astype('int64')
+        upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+        fraction = position - lower
+        out = np.full(len(counts), np.nan)
+        lo = values[(starts + lower)[has_values]]
+        hi = values[(starts + upper)[has_values]]
+        out[has_values] = lo + (hi - lo) * fraction[has_values]
+        result[p] = out
+    return result
+
+def group_percentiles(values, group, k, percentiles=PERCENTILES):
+    """Percentili per gruppo e di tutti i valori (interpolazione lineare come np.percentile; NaN esclusi).
+
+    Restituisce ({p: array di lunghezza k}, {p: valore di tutti i gruppi}); NaN per i gruppi senza valori.
+    """
+    finite = ~np.isnan(values)
+    values = values[finite]
+    group = group[finite]
+
+    # Un ordinamento per valore (serve anche ai percentili complessivi), poi uno stabile per gruppo:
+    # con codici a 16 bit NumPy usa il radix sort, molto più rapido di np.lexsort
+    by_value = np.argsort(values)
+    group_dtype = 'int16' if k <= np.iinfo('int16').max else 'int64'
+    order = by_value[np.argsort(group.astype(group_dtype)[by_value], kind='stable')]
+
+    counts = np.bincount(group, minlength=k)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    per_group = _sorted_percentiles(values[order], starts, counts, percentiles)
+    overall = _sorted_percentiles(values[by_value], np.zeros(1, dtype='int64'), np.array([len(values)]), percentiles)
+    return per_group, {p: overall[p][0] for p in percentiles}
+
+def group_slopes(x, y, group, k):
+    """Pendenza della retta dei minimi quadrati y ~ x per gruppo e di tutti i punti (NaN se x non varia)."""
+    finite = ~(np.isnan(x) | np.isnan(y))
+    x, y, group = x[finite], y[finite], group[finite]
+
+    n = np.bincount(group, minlength=k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Scarti dalla media del gruppo: evita la cancellazione numerica di Σx² - (Σx)²/n
+        mean_x = np.bincount(group, weights=x, minlength=k) / n
+        mean_y = np.bincount(group, weights=y, minlength=k) / n
+        dx = x - mean_x[group]
+        dy = y - mean_y[group]
+        sxx = np.bincount(group, weights=dx * dx, minlength=k)
+        sxy = np.bincount(group, weights=dx * dy, minlength=k)
+        slopes = sxy / sxx
+    slopes[~(sxx > 1e-12)] = np.nan
+
+    overall = np.nan
+    if len(x) > 1:
+        dx = x - x.mean()
+        sxx_all = dx @ dx
+        if sxx_all > 1e-12:
+            overall = dx @ (y - y.mean()) / sxx_all
+    return slopes, overall
+
+def zscores(values):
+    """Z-score di ogni valore rispetto alla distribuzione dei valori (NaN esclusi)."""
+    finite = values[~np.isnan(values)]
+    if len(finite) < 2:
+        return np.full(len(values), np.nan)
+    std = finite.std(ddof=1)
+    if std == 0:
+        return np.full(len(values), np.nan)
+    return (values - finite.mean()) / std
+
+def metric_table(stats):
+    """Statistiche di un cliente (riga di cohort_statistics) come tabella metrica × statistica."""
+    return pd.DataFrame([
+        {
+            'Metrica': COHORT_LABELS[col],
+            **{f'P{p}': stats[f'p{p}_{col}'] for p in PERCENTILES},
+            'Trend/settimana': stats[f'trend_settimanale_{col}'],
+            'Z-score': stats[f'z_{col}'],
+        }
+        for col in COHORT_COLUMNS
+    ])
+
+def cohort_statistics(frame, group, clients, valid, client_col='nome_cliente_normalizzato',
+                      cohort_label='Coorte'):
+    """Tabella delle statistiche di coorte: una riga per cliente più la riga della coorte.
+
+    Per ogni metrica di COHORT_COLUMNS:
+    - p10/p50/p90 delle notti valide del cliente (coorte: di tutte le notti valide);
+    - trend_settimanale: variazione per settimana (pendenza sulla data in settimane);
+    - z: z-score della media del cliente rispetto alle medie di tutti i clienti.
+
+    group: codice del cliente di ogni riga di frame; valid: maschera delle notti valide.
+    """
+    k = len(clients)
+    positions = np.flatnonzero(valid)
+    g = group[positions]
+
+    # Settimane dalla prima notte dell'archivio (la pendenza non dipende dall'origine)
+    dates = pd.to_datetime(frame['data_compilazione'], errors='coerce').to_numpy()[positions]
+    known = ~np.isnat(dates)
+    weeks = np.full(len(dates), np.nan)
+    if known.any():
+        weeks[known] = (dates[known] - dates[known].min()) / np.timedelta64(7, 'D')
+
+    table = {client_col: list(clients) + [cohort_label]}
+    for col in COHORT_COLUMNS:
+        if col in frame.columns:
+            values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype='float64')[positions]
+        else:
+            values = np.full(len(positions), np.nan)
+
+        per_client, pooled = group_percentiles(values, g, k)
+        for p in PERCENTILES:
+            table[f'p{p}_{col}'] = np.append(per_client[p], pooled[p])
+
+        slopes, pooled_slope = group_slopes(weeks, values, g, k)
+        table[f'trend_settimanale_{col}'] = np.append(slopes, pooled_slope)
+
+        finite = ~np.isnan(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (np.bincount(g[finite], weights=values[finite], minlength=k)
+                     / np.bincount(g[finite], minlength=k))
+        table[f'z_{col}'] = np.concatenate([zscores(means), [np.nan]])
+
+    return pd.DataFrame(table)
@@ -0,0 +1,388 @@
+import re
+import os
+import pandas as pd
+import numpy as np
+from datetime import time
+from functools import lru_cache
+
+from .profiling import NULL_PROFILER
+from .quality import (
+    TIME_REASONS, DURATION_REASONS, TIME_REASON_COLUMNS, DURATION_REASON_COLUMNS, reason_series
+)
+
+# Regex e tabelle precompilate (condivise da tutte le istanze)
+TIME_TEXT_RE = re.compile(r'non|dormito|divano|ricordo|addormentato|penso')
+TIME_SEPARATORS = str.maketrans({'.': ':', ',': ':', ';': ':', "'": ':', ' ': None})
+DURATION_TEXT_ZERO = frozenset(['0', '00', 'secondi', 'non saprei', 'no', 'non ricordo', 'nessuna'])
+DURATION_UNRELIABLE_RE = re.compile(r'non ho dormito|quasi tutta|tutta notte|penso di non|non penso')
+DIGITS_RE = re.compile(r'\d+')
+
+# Mappatura colonne basata sul file Excel reale
+COLUMN_MAP = {
+    'nome_cliente': 6,  # Colonna "Inserisci il tuo Nome e Cognome"
+    'ora_letto': 7,     # Colonna H
+    'ora_spento_luci': 8,  # Colonna I
+    'latenza': 9,       # Colonna J
+    'num_risvegli': 10,
+    'veglia_notte': 11,  # Colonna L
+    'ora_sveglia_finale': 12,  # Colonna M
+    'ora_alzato': 13,   # Colonna N
+    'data_compilazione': 1  # Start time
+}
+
+# Colonne degli orari puliti (minuti dalla mezzanotte, Int16 nullable)
+TIME_COLUMNS = ['ora_letto_clean', 'ora_spento_luci_clean', 'ora_sveglia_finale_clean', 'ora_alzato_clean']
+
+def minutes_to_times(values):
+    """Converte minuti dalla mezzanotte (NaN/NA se mancante) in datetime.time/None."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype='float64'), use_na_sentinel=True)
+    lookup = np.empty(len(uniques) + 1, dtype=object)
+    lookup[:-1] = [time(int(m) // 60, int(m) % 60) for m in uniques]
+    lookup[-1] = None
+    return lookup[codes]
+
+# Codici degli esiti del parsing (posizioni in quality.TIME_REASONS / DURATION_REASONS)
+TIME_OK, TIME_MISSING, TIME_UNPARSEABLE, TIME_TYPO = (TIME_REASONS.index(r) for r in
+    ['ok', 'mancante', 'non_interpretabile', 'refuso_corretto'])
+DURATION_OK, DURATION_MISSING, DURATION_UNPARSEABLE, DURATION_UNRELIABLE, DURATION_OVER_120 = (
+    DURATION_REASONS.index(r) for r in ['ok', 'mancante', 'non_interpretabile', 'non_affidabile', 'oltre_120_min'])
+
+# Valori distinti di una colonna sotto i quali la modalità parallela resta su un solo processo
+PARALLEL_MIN_VALUES = 50_000
+
+def column_map(df):
+    """Posizioni delle colonne di input: quelle di un file letto con proiezione
+    (vedi data_loader) sono salvate in df.attrs['col_map']."""
+    return df.attrs.get('col_map', COLUMN_MAP)
+
+# Cleaner dei processi worker (uno per processo, con la propria cache)
+_worker_cleaner = None
+
+def _parse_shard(kind, values):
+    """Interpreta una porzione di valori distinti in un processo worker."""
+    global _worker_cleaner
+    if _worker_cleaner is None:
+        _worker_cleaner = SleepDataCleaner()
+    return _worker_cleaner.parse_values(kind, values)
+
+class SleepDataCleaner:
+    """Pulisce i dati del sonno gestendo TUTTI i formati sporchi per tutti i clienti.
+
+    Con workers > 1 i valori distinti di orari e durate sono suddivisi tra più
+    processi quando una colonna ne ha almeno parallel_threshold (sotto la
+    soglia l'avvio del pool costa più del parsing). Il risultato è identico
+    a quello seriale: ogni porzione torna al suo posto nella tabella di lookup.
+    """
+
+    def __init__(self, cache_size=4096, profiler=None, workers=1, parallel_threshold=PARALLEL_MIN_VALUES):
+        # Profiler opzionale (vedi profiling.StageProfiler): misura le fasi di clean_data
+        self.profiler = profiler or NULL_PROFILER
+
+        # Modalità parallela (workers=None: numero di CPU); il pool è creato al primo uso
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self._executor = None
+
+        # Cache limitata (LRU) dei valori già interpretati: gli export ripetono poche centinaia di stringhe
+        self.cache_size = cache_size
+        self._parse_time_cached = lru_cache(maxsize=cache_size, typed=True)(self._parse_time_value)
+        self._parse_duration_cached = lru_cache(maxsize=cache_size, typed=True)(self._parse_duration_value)
+
+    def cache_stats(self):
+        """Statistiche della cache dei parser (hit, miss, dimensione, hit rate)."""
+        stats = {}
+        for name, cached in [('orari', self._parse_time_cached), ('durate', self._parse_duration_cached)]:
+            info = cached.cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = {
+                'hits': info.hits,
+                'misses': info.misses,
+                'size': info.currsize,
+                'maxsize': info.maxsize,
+                'hit_rate': info.hits / lookups if lookups else 0.0,
+            }
+        return stats
+
+    def clear_cache(self):
+        """Svuota la cache dei parser."""
+        self._parse_time_cached.cache_clear()
+        self._parse_duration_cached.cache_clear()
+
+    def close(self):
+        """Chiude il pool di processi della modalità parallela (se avviato)."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def parse_values(self, kind, values):
+        """Interpreta una lista di valori come coppie (valore, codice esito).
+
+        'orari' → minuti dalla mezzanotte (-1 se mancante), 'durate' → minuti.
+        """
+        if kind == 'orari':
+            parsed_values = []
+            for value in values:
+                parsed, reason = self.parse_time_detail(value)
+                parsed_values.append((-1 if parsed is None else parsed.hour * 60 + parsed.minute, reason))
+            return parsed_values
+        return [self.parse_duration_detail(value) for value in values]
+
+    def parse_uniques(self, kind, uniques):
+        """Come parse_values, suddividendo i valori tra i processi worker sopra la soglia."""
+        if self.workers <= 1 or len(uniques) < self.parallel_threshold:
+            return self.parse_values(kind, uniques)
+
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        values = list(uniques)
+        size = -(-len(values) // self.workers)
+        shards = [values[start:start + size] for start in range(0, len(values), size)]
+
+        # map restituisce le porzioni nell'ordine di invio: risultato deterministico
+        parsed = []
+        for part in self._executor.map(_parse_shard, [kind] * len(shards), shards):
+            parsed.extend(part)
+        return parsed
+
+    def parse_time_column(self, series, reason_col=None):
+        """Orari puliti di una colonna come minuti dalla mezzanotte (Int16 nullable, 2 byte per riga).
+
+        Con reason_col restituisce anche la colonna categorica degli esiti, letta
+        dalla stessa tabella di lookup dei valori distinti.
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        parsed = self.parse_uniques('orari', uniques)
+
+        # -1 = orario mancante; l'ultimo elemento corrisponde ai valori mancanti (codice -1)
+        lookup = np.full(len(uniques) + 1, -1, dtype='int16')
+        lookup[:-1] = [minutes for minutes, _ in parsed]
+
+        minutes = lookup[codes]
+        result = pd.Series(pd.arrays.IntegerArray(minutes, minutes < 0), index=series.index)
+        if reason_col is None:
+            return result
+
+        reasons = np.full(len(uniques) + 1, TIME_MISSING, dtype='int8')
+        reasons[:-1] = [reason for _, reason in parsed]
+        return result, reason_series(reasons[codes], reason_col, series.index)
+
+    def parse_duration_column(self, series, reason_col=None):
+        """Durate in minuti di una colonna (float32, mancanti e outlier → 0).
+
+        Con reason_col restituisce anche la colonna categorica degli esiti: lo 0
+        di un valore mancante o scartato resta distinguibile da uno 0 dichiarato.
+        """
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        parsed = self.parse_uniques('durate', uniques)
+
+        # L'ultimo elemento corrisponde ai valori mancanti (codice -1)
+        lookup = np.empty(len(uniques) + 1, dtype=object)
+        lookup[:-1] = [value for value, _ in parsed]
+        lookup[-1], missing_reason = self.parse_duration_detail(None)
+
+        values = pd.Series(lookup[codes], index=series.index, dtype=object).infer_objects()
+        result = pd.to_numeric(values, errors='coerce').fillna(0).astype('float32')
+        if reason_col is None:
+            return result
+
+        reasons = np.full(len(uniques) + 1, missing_reason, dtype='int8')
+        reasons[:-1] = [reason for _, reason in parsed]
+        return result, reason_series(reasons[codes], reason_col, series.index)
+
+    def normalize_names(self, series):
+        """Nomi cliente normalizzati (spazi, maiuscole) come colonna categorica."""
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+
+        # Varianti diverse dello stesso nome ("MARIO ROSSI", " mario rossi") → stessa categoria
+        normalized = pd.Index([str(x).strip().title() for x in uniques], dtype=object)
+        name_codes, categories = pd.factorize(normalized)
+        name_codes = np.append(name_codes, -1)  # codice -1 → nome mancante
+
+        return pd.Series(
+            pd.Categorical.from_codes(name_codes[codes], categories=categories),
+            index=series.index
+        )
+
+    def parse_time_string(self, time_str):
+        """Converte QUALSIASI formato di orario in datetime.time."""
+        return self.parse_time_detail(time_str)[0]
+
+    def parse_time_detail(self, time_str):
+        """Come parse_time_string, restituendo (orario, codice esito di quality.TIME_REASONS)."""
+        if pd.isna(time_str) or time_str == '' or time_str is None:
+            return None, TIME_MISSING
+
+        try:
+            return self._parse_time_cached(time_str)
+        except TypeError:
+            # Valore non hashable: nessuna cache
+            return self._parse_time_value(time_str)
+
+    def _parse_time_value(self, time_str):
+        """Interpreta un singolo orario già verificato come non vuoto: (orario, codice esito)."""
+        time_str = str(time_str).strip()
+
+        # Rimuovi testo descrittivo
+        if TIME_TEXT_RE.search(time_str.lower()):
+            return None, TIME_UNPARSEABLE
+
+        # Rimuovi parte dopo slash se presente (es. "10:40/11:00" → "10:40")
+        if '/' in time_str:
+            time_str = time_str.split('/')[0].strip()
+
+        # Gestisci typo comuni: "223;15" → "23:15"
+        ok = TIME_OK
+        if time_str.startswith('2') and len(time_str) > 5:
+            time_str = time_str[1:]  # Rimuovi primo 2 se sembra un typo
+            ok = TIME_TYPO
+
+        # Sostituisci separatori NON standard (. , ; ' → due punti) e rimuovi spazi
+        time_str = time_str.translate(TIME_SEPARATORS)
+
+        # Gestisci "24:XX" e "24.XX" (ore oltre 24)
+        parts = time_str.split(':')
+        if len(parts) >= 2:
+            try:
+                hours = int(parts[0])
+                minutes = int(parts[1])
+
+                # Se ore >= 24, converti in formato 00-23
+                if hours >= 24:
+                    hours = hours - 24
+
+                # Validazione
+                if 0 <= hours <= 23 and 0 <= minutes <= 59:
+                    return time(hours, minutes), ok
+            except:
+                pass
+
+        # Prova numero intero (es. "22" → 22:00)
+        try:
+            num = float(time_str)
+            hours = int(num)
+
+            if hours >= 24:
+                hours = hours - 24
+
+            if 0 <= hours <= 23:
+                return time(hours, 0), ok
+        except:
+            pass
+
+        return None, TIME_UNPARSEABLE
+
+    def parse_duration_minutes(self, duration_str):
+        """Converte QUALSIASI formato di durata in minuti."""
+        return self.parse_duration_detail(duration_str)[0]
+
+    def parse_duration_detail(self, duration_str):
+        """Come parse_duration_minutes, restituendo (minuti, codice esito di quality.DURATION_REASONS)."""
+        if pd.isna(duration_str) or duration_str == '' or duration_str is None:
+            return 0, DURATION_MISSING
+
+        try:
+            return self._parse_duration_cached(duration_str)
+        except TypeError:
+            # Valore non hashable: nessuna cache
+            return self._parse_duration_value(duration_str)
+
+    def _parse_duration_value(self, duration_str):
+        """Interpreta una singola durata già verificata come non vuota: (minuti, codice esito)."""
+        duration_str = str(duration_str).strip().lower()
+
+        # Casi speciali testuali = 0
+        if duration_str in DURATION_TEXT_ZERO:
+            return 0, DURATION_OK
+
+        # Testi descrittivi che indicano valori non affidabili = None
+        if DURATION_UNRELIABLE_RE.search(duration_str):
+            return None, DURATION_UNRELIABLE  # Segna come dato non affidabile
+
+        # Rimuovi testo comune
+        duration_str = duration_str.replace('min', '').replace('minuti', '').replace('mi', '').strip()
+
+        # Range con slash (es. "10/15" → media)
+        if '/' in duration_str:
+            parts = duration_str.split('/')
+            try:
+                matches = [DIGITS_RE.search(p) for p in parts]
+                nums = [float(m.group()) for m in matches if m]
+                if nums:
+                    return sum(nums) / len(nums), DURATION_OK
+            except:
+                pass
+
+        # Formato HH:MM (potenziale outlier!)
+        if ':' in duration_str:
+            parts = duration_str.split(':')
+            try:
+                hours = int(parts[0])
+                minutes = int(parts[1])
+                total_minutes = hours * 60 + minutes
+
+                # OUTLIER DETECTION: latenza > 2 ore è irrealistico
+                if total_minutes > 120:
+                    return None, DURATION_OVER_120  # Marca come outlier
+
+                return total_minutes, DURATION_OK
+            except:
+                pass
+
+        # Estrai primo numero
+        number = DIGITS_RE.search(duration_str)
+        if number:
+            value = float(number.group())
+
+            # OUTLIER DETECTION: latenza > 120 min è irrealistico
+            if value > 120:
+                return None, DURATION_OVER_120
+
+            return value, DURATION_OK
+
+        return 0, DURATION_UNPARSEABLE
+
+    def clean_data(self, df):
+        """Pulisce tutti i dati del dataframe.
+
+        Le colonne pulite sono compatte: orari in minuti dalla mezzanotte (Int16),
+        nomi categorici, durate float32, esiti del parsing categorici (esito_*). Il dataframe di input non viene modificato
+        (copia superficiale: le colonne originali non vengono duplicate).
+        """
+        with self.profiler.stage('clean_data', rows=len(df)):
+            df = df.copy(deep=False)
+
+            col_map = column_map(df)
+
+            with self.profiler.stage('nomi_date', rows=len(df)):
+                # 1. Nome cliente normalizzato
+                df['nome_cliente_normalizzato'] = self.normalize_names(df.iloc[:, col_map['nome_cliente']])
+
+                # 2. Data compilazione
+                df['data_compilazione'] = pd.to_datetime(df.iloc[:, col_map['data_compilazione']], errors='coerce')
+
+            # Esiti del parsing (quality.py), aggiunti dopo le colonne pulite
+            reasons = {}
+
+            with self.profiler.stage('orari', rows=len(df)):
+                # 3. Orari puliti (con l'esito del parsing di ciascuno)
+                for clean_col, source in [
+                    ('ora_letto_clean', 'ora_letto'),
+                    ('ora_spento_luci_clean', 'ora_spento_luci'),
+                    ('ora_sveglia_finale_clean', 'ora_sveglia_finale'),
+                    ('ora_alzato_clean', 'ora_alzato'),
+                ]:
+                    reason_col = TIME_REASON_COLUMNS[clean_col]
+                    df[clean_col], reasons[reason_col] = self.parse_time_column(df.iloc[:, col_map[source]], reason_col)
+
+            with self.profiler.stage('durate', rows=len(df)):
+                # 4. Latenza in minuti (con gestione outlier; None → 0 dopo outlier detection)
+                # 5. Veglia infrasonno in minuti (con gestione outlier; None → 0 dopo outlier detection)
+                for clean_col, source in [('latenza_minuti', 'latenza'), ('veglia_infrasonno_minuti', 'veglia_notte')]:
+                    reason_col = DURATION_REASON_COLUMNS[clean_col]
+                    df[clean_col], reasons[reason_col] = self.parse_duration_column(df.iloc[:, col_map[source]], reason_col)
+
+            for reason_col, values in reasons.items():
+                df[reason_col] = values
+
+        return df
@@ -0,0 +1,210 @@
+import io
+import os
+import time
+import hashlib
+import tracemalloc
+import importlib.util
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .data_cleaner import COLUMN_MAP
+from .profiling import NULL_PROFILER
+
+# Estensioni supportate per formato
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+LEGACY_EXCEL_EXTENSIONS = ('.xls',)
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+# Righe per blocco nella lettura a blocchi (iter_chunks)
+DEFAULT_CHUNK_ROWS = 50_000
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo (MB), se disponibile."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KB, macOS byte
+    return peak / 1024 ** 2 if os.uname().sysname == 'Darwin' else peak / 1024
+
+def content_hash(data):
+    """Hash SHA-256 del contenuto di un file (chiave delle cache dei risultati)."""
+    return hashlib.sha256(data).hexdigest()
+
+def projected_positions(col_map=COLUMN_MAP):
+    """Posizioni (ordinate) delle sole colonne usate da clean_data."""
+    return sorted(set(col_map.values()))
+
+def projected_column_map(col_map=COLUMN_MAP):
+    """Mappatura delle colonne dopo la proiezione (posizioni nel dataframe ridotto)."""
+    positions = projected_positions(col_map)
+    return {name: positions.index(pos) for name, pos in col_map.items()}
+
+class DiaryLoader:
+    """Legge gli export del diario caricando solo le colonne usate da clean_data.
+
+    Excel: python-calamine se installato, altrimenti openpyxl in sola lettura
+    (streaming riga per riga); .xls e file non leggibili in streaming usano
+    pd.read_excel. CSV e Parquet sono letti direttamente con proiezione.
+    Dopo ogni lettura `last_stats` riporta righe, tempo, picco di memoria e motore;
+    track_memory=True aggiunge il picco allocato durante la lettura (tracemalloc,
+    preciso ma rallenta molto la lettura Excel).
+    """
+
+    def __init__(self, col_map=COLUMN_MAP, track_memory=False, profiler=None):
+        self.col_map = col_map
+        self.profiler = profiler or NULL_PROFILER
+        self.positions = projected_positions(col_map)
+        self.track_memory = track_memory
+        self.last_stats = None
+
+    def load(self, source, filename=None):
+        """Legge un file (percorso, bytes o file-like) e restituisce il dataframe proiettato."""
+        filename = filename or (source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', ''))
+        extension = os.path.splitext(str(filename))[1].lower()
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+
+        tracing = self.track_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+
+        try:
+            with self.profiler.stage('load') as stage:
+                if extension in CSV_EXTENSIONS:
+                    df, engine = self._read_csv(source), 'csv'
+                elif extension in PARQUET_EXTENSIONS:
+                    df, engine = self._read_parquet(source), 'parquet'
+                elif extension in LEGACY_EXCEL_EXTENSIONS:
+                    df, engine = self._read_excel_full(source), 'pandas'
+                else:
+                    df, engine = self._read_excel(source)
+                stage['rows'] = len(df)
+
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if tracing else None
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+        self.last_stats = {
+            'file': os.path.basename(str(filename)),
+            'engine': engine,
+            'rows': len(df),
+            'columns': df.shape[1],
+            'seconds': elapsed,
+            'rows_per_sec': len(df) / elapsed if elapsed > 0 else None,
+            'peak_memory_mb': peak / 1024 ** 2 if peak is not None else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        return df
+
+    def _projected(self, df):
+        """Segna il dataframe come proiettato (clean_data legge df.attrs['col_map'])."""
+        df.attrs['col_map'] = projected_column_map(self.col_map)
+        return df
+
+    def _read_excel(self, source):
+        """Excel con il motore più veloce disponibile."""
+        if importlib.util.find_spec('python_calamine') is not None:
+            df = pd.read_excel(source, engine='calamine', usecols=self.positions)
+            return self._projected(df), 'calamine'
+
+        try:
+            return self._read_excel_streaming(source), 'openpyxl-streaming'
+        except Exception:
+            # Formato inatteso: torna alla lettura completa con pandas
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return self._read_excel_full(source), 'pandas'
+
+    def _read_excel_streaming(self, source):
+        """Legge il primo foglio con openpyxl read-only, tenendo solo le colonne proiettate."""
+        return list(self._excel_chunks(source))[0]
+
+    def _excel_chunks(self, source, chunk_rows=None):
+        """Righe del primo foglio (openpyxl read-only) in blocchi di chunk_rows (None: un solo blocco)."""
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        try:
+            sheet = workbook.worksheets[0]
+            rows = sheet.iter_rows(min_col=1, max_col=self.positions[-1] + 1, values_only=True)
+
+            header = next(rows, None)
+            if header is None:
+                raise ValueError("Foglio vuoto")
+            header = list(header) + [None] * (self.positions[-1] + 1 - len(header))
+            names = [header[pos] if header[pos] is not None else f'Unnamed: {pos}' for pos in self.positions]
+
+            columns = [[] for _ in self.positions]
+            n_rows = 0
+            yielded = False
+            for row in rows:
+                if row is None or all(value is None for value in row):
+                    continue
+                for values, pos in zip(columns, self.positions):
+                    values.append(row[pos] if pos < len(row) else None)
+                n_rows += 1
+                if chunk_rows and n_rows == chunk_rows:
+                    yield self._excel_frame(columns, names)
+                    yielded = True
+                    columns = [[] for _ in self.positions]
+                    n_rows = 0
+            if n_rows or not yielded:
+                yield self._excel_frame(columns, names)
+        finally:
+            workbook.close()
+
+    def _excel_frame(self, columns, names):
+        df = pd.DataFrame({i: values for i, values in enumerate(columns)})
+        df.columns = names
+        return self._projected(df)
+
+    def iter_chunks(self, source, filename=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Legge il file a blocchi di chunk_rows righe (dataframe proiettati, come load).
+
+        CSV, Parquet ed Excel .xlsx sono letti in streaming; i file .xls non
+        sono leggibili a blocchi e vengono letti interi e poi suddivisi.
+        """
+        filename = filename or (source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', ''))
+        extension = os.path.splitext(str(filename))[1].lower()
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+
+        if extension in CSV_EXTENSIONS:
+            with pd.read_csv(source, usecols=self.positions, chunksize=chunk_rows) as reader:
+                for chunk in reader:
+                    yield self._projected(chunk)
+        elif extension in PARQUET_EXTENSIONS:
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(source)
+            names = [parquet_file.schema_arrow.names[pos] for pos in self.positions]
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=names):
+                yield self._projected(batch.to_pandas())
+        elif extension in LEGACY_EXCEL_EXTENSIONS:
+            df = self._read_excel_full(source)
+            for start in range(0, max(len(df), 1), chunk_rows):
+                yield df.iloc[start:start + chunk_rows]
+        else:
+            yield from self._excel_chunks(source, chunk_rows)
+
+    def _read_excel_full(self, source):
+        """Percorso originale: pd.read_excel di tutte le colonne."""
+        return pd.read_excel(source)
+
+    def _read_csv(self, source):
+        return self._projected(pd.read_csv(source, usecols=self.positions))
+
+    def _read_parquet(self, source):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        names = [parquet_file.schema_arrow.names[pos] for pos in self.positions]
+        return self._projected(parquet_file.read(columns=names).to_pandas())
@@ -0,0 +1,224 @@
+import io
+import os
+import tempfile
+import importlib.util
+from datetime import datetime, date, time
+
+import numpy as np
+import pandas as pd
+
+from .data_cleaner import TIME_COLUMNS, minutes_to_times
+from .client_index import ALL_CLIENTS
+from .quality import REASON_COLUMNS, quality_report
+
+# Formati di export → (estensione, MIME)
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Formati scrivibili a blocchi (StreamingExport)
+STREAMING_FORMATS = ('csv', 'parquet')
+
+# Righe convertite per volta durante la scrittura Excel in streaming
+EXPORT_CHUNK_ROWS = 10_000
+
+def available_formats():
+    """Formati di export utilizzabili con le librerie installate."""
+    formats = ['xlsx', 'csv']
+    if importlib.util.find_spec('pyarrow') is not None:
+        formats.append('parquet')
+    return formats
+
+def iter_rows(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Righe del dataframe come tuple Python (None per i mancanti), convertite a blocchi."""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        columns = []
+        for col in chunk.columns:
+            values = chunk[col].to_numpy(dtype=object, copy=True)
+            values[pd.isna(chunk[col]).to_numpy()] = None
+            columns.append(values)
+        yield from zip(*columns)
+
+def as_text(value):
+    """Valore di una colonna mista come testo (orari in HH:MM, None per i mancanti)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    return str(value)
+
+def export_xlsx(df, sheet_name='Risultati', extra_sheets=None):
+    """Excel scritto riga per riga: xlsxwriter in constant_memory se installato, altrimenti openpyxl write-only.
+
+    extra_sheets: altri fogli {nome: dataframe} scritti dopo quello dei risultati.
+    """
+    sheets = {sheet_name: df, **(extra_sheets or {})}
+    if importlib.util.find_spec('xlsxwriter') is not None:
+        return _export_xlsx_xlsxwriter(sheets)
+    return _export_xlsx_openpyxl(sheets)
+
+def _export_xlsx_xlsxwriter(sheets):
+    import xlsxwriter
+
+    # constant_memory non è compatibile con in_memory: si passa da un file temporaneo
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {
+            'constant_memory': True,
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+        header_format = workbook.add_format({'bold': True})
+        datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        time_format = workbook.add_format({'num_format': 'hh:mm'})
+
+        # In constant_memory i fogli vanno scritti uno alla volta, nell'ordine
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+
+            for r, row in enumerate(iter_rows(df), start=1):
+                for c, value in enumerate(row):
+                    if value is None:
+                        continue
+                    if isinstance(value, datetime):
+                        worksheet.write_datetime(r, c, value, datetime_format)
+                    elif isinstance(value, date):
+                        worksheet.write_datetime(r, c, value, date_format)
+                    elif isinstance(value, time):
+                        worksheet.write_datetime(r, c, value, time_format)
+                    elif isinstance(value, (float, np.floating)) and not np.isfinite(value):
+                        continue
+                    else:
+                        worksheet.write(r, c, value)
+
+        workbook.close()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def _export_xlsx_openpyxl(sheets):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append([str(c) for c in df.columns])
+        for row in iter_rows(df):
+            worksheet.append(row)
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def prepare_export(df):
+    """Orari puliti (minuti dalla mezzanotte) riportati a orari leggibili per l'export."""
+    df = df.copy(deep=False)
+    for col in TIME_COLUMNS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = minutes_to_times(df[col])
+    return df
+
+def export_bytes(df, fmt='xlsx'):
+    """Contenuto del file di export nel formato richiesto (xlsx, csv, parquet)."""
+    df = prepare_export(df)
+    if fmt == 'xlsx':
+        # Conteggi di qualità per cliente in un foglio a parte
+        extra_sheets = None
+        if 'nome_cliente_normalizzato' in df.columns and any(col in df.columns for col in REASON_COLUMNS):
+            extra_sheets = {'Qualità': quality_report(df)}
+        return export_xlsx(df, extra_sheets=extra_sheets)
+    if fmt == 'csv':
+        # BOM UTF-8: Excel apre correttamente accenti ed emoji
+        return df.to_csv(index=False).encode('utf-8-sig')
+    if fmt == 'parquet':
+        output = io.BytesIO()
+        text_columns(df).to_parquet(output, index=False)
+        return output.getvalue()
+    raise ValueError(f"Formato di export non supportato: {fmt}")
+
+def text_columns(df, columns=None):
+    """Colonne object miste (testo, numeri, orari) come testo: pyarrow non le converte.
+
+    columns: colonne da convertire comunque (es. quelle grezze dell'export).
+    """
+    for col in df.columns:
+        if df[col].dtype == object or (columns is not None and col in columns):
+            # Conversione dei soli valori distinti (come nel parsing di SleepDataCleaner)
+            codes, uniques = pd.factorize(df[col].astype(object))
+            texts = np.array([as_text(value) for value in uniques] + [None], dtype=object)
+            df[col] = texts[codes]
+    return df
+
+class StreamingExport:
+    """Scrive i risultati su file a blocchi (csv o parquet), senza tenerli tutti in memoria.
+
+    Lo schema Parquet è fissato dal primo blocco: le colonne grezze dell'export
+    (raw_columns), il cui tipo può cambiare da un blocco all'altro, sono scritte come testo.
+    """
+
+    def __init__(self, path, fmt='csv', raw_columns=None):
+        if fmt not in STREAMING_FORMATS:
+            raise ValueError(f"Formato non scrivibile a blocchi: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.raw_columns = raw_columns
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, df):
+        df = prepare_export(df)
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+
+        if self.fmt == 'csv':
+            if self._file is None:
+                # BOM UTF-8 una sola volta, all'inizio del file
+                self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+                df.to_csv(self._file, index=False)
+            else:
+                df.to_csv(self._file, index=False, header=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            df = text_columns(df, self.raw_columns)
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                # Colonne vuote nel primo blocco: testo (il tipo null non accetta valori successivi)
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                    for field in table.schema
+                ]).remove_metadata()
+                self._writer = pq.ParquetWriter(self.path, schema)
+            table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def export_filename(selected_client, fmt):
+    """Nome del file di download per cliente e formato."""
+    extension = EXPORT_FORMATS[fmt][0]
+    if selected_client == ALL_CLIENTS:
+        return f"risultati_tutti_clienti.{extension}"
+    return f"risultati_{selected_client.replace(' ', '_')}.{extension}"
@@ -0,0 +1,241 @@
+"""Analisi in background: job eseguiti in un pool di thread, con avanzamento e annullamento.
+
+Un job è identificato da una chiave (es. hash dell'input e cliente): finché è
+in corso o conservato, chi chiede la stessa chiave ritrova lo stesso job. Così
+i rerun di Streamlit non interrompono né ripetono il calcolo.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .profiling import NULL_PROFILER
+from .sleep_calculator import SleepCalculator
+from .client_index import ClientIndex
+
+# Stati di un job
+PENDING = 'in_attesa'
+RUNNING = 'in_corso'
+DONE = 'completato'
+CANCELLED = 'annullato'
+FAILED = 'errore'
+
+# Fasi principali di run_analysis (per la frazione completata)
+ANALYSIS_STAGES = ['metriche', 'indice_clienti', 'statistiche_coorte', 'regolarita', 'righe_cliente']
+
+class JobCancelled(Exception):
+    """Il job è stato annullato: sollevata al primo controllo dopo cancel()."""
+
+class AnalysisJob:
+    """Un calcolo in background con fasi, avanzamento e annullamento cooperativo.
+
+    stage() ha la stessa forma di StageProfiler.stage: il job può essere passato
+    come profiler a SleepCalculator, così anche le sue fasi interne aggiornano
+    l'avanzamento. L'annullamento è controllato all'inizio e alla fine di ogni
+    fase (una fase già avviata non viene interrotta a metà).
+    """
+
+    def __init__(self, key, stages=(), profiler=None):
+        self.key = key
+        self.stages = list(stages)
+        # Profiler opzionale: misura le fasi del job (vedi profiling.StageProfiler)
+        self.profiler = profiler or NULL_PROFILER
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.completed = []
+        self._stack = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        """True quando il job è concluso (completato, annullato o fallito)."""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Attende la fine del job; restituisce False se scade il timeout."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Chiede l'annullamento: il job si ferma al prossimo confine di fase."""
+        self._cancel.set()
+        with self._lock:
+            if self.status == PENDING:
+                # Non ancora avviato: non partirà
+                self.status = CANCELLED
+                self._done.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job annullato: {self.key}")
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Fase del job: aggiorna l'avanzamento e controlla l'annullamento prima e dopo."""
+        self.check_cancelled()
+        with self._lock:
+            self._stack.append(name)
+        try:
+            with self.profiler.stage(name, rows=rows) as record:
+                yield record
+        finally:
+            with self._lock:
+                self._stack.pop()
+                if not self._stack and name in self.stages:
+                    self.completed.append(name)
+        self.check_cancelled()
+
+    def skip(self, *names):
+        """Segna come completate fasi non necessarie (es. risultati già disponibili)."""
+        with self._lock:
+            self.completed.extend(name for name in names if name in self.stages)
+
+    def progress(self):
+        """Stato attuale: fase principale e dettaglio in corso, fasi completate, frazione."""
+        with self._lock:
+            completed = len(set(self.completed))
+            total = len(self.stages)
+            return {
+                'stato': self.status,
+                'fase': self._stack[0] if self._stack else None,
+                'dettaglio': '/'.join(self._stack),
+                'completate': completed,
+                'totale': total,
+                'frazione': 1.0 if self.status == DONE else (completed / total if total else 0.0),
+            }
+
+    def run(self, func, *args):
+        """Esegue func(job, *args) registrando risultato o errore (chiamato dal pool)."""
+        with self._lock:
+            if self.status != PENDING:
+                return
+            self.status = RUNNING
+        try:
+            result = func(self, *args)
+        except JobCancelled:
+            status, result = CANCELLED, None
+        except Exception as e:
+            status, result = FAILED, None
+            self.error = e
+        else:
+            status = DONE
+        with self._lock:
+            self.result = result
+            self.status = status
+        self._done.set()
+
+class JobManager:
+    """Pool di thread che esegue i job e li conserva per chiave.
+
+    submit() con una chiave già in corso o completata restituisce il job
+    esistente; i job annullati o falliti vengono rieseguiti. Si conservano al
+    più `max_jobs` job (i conclusi meno recenti vengono dimenticati) e
+    `max_shared` risultati condivisi tra job (shared).
+    """
+
+    def __init__(self, workers=1, max_jobs=8, max_shared=4):
+        self.max_jobs = max_jobs
+        self.max_shared = max_shared
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analisi')
+        self._jobs = OrderedDict()
+        self._shared = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Job con questa chiave (None se non c'è)."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, key, func, *args, stages=(), profiler=None):
+        """Avvia func(job, *args) in background, o restituisce il job già esistente per la chiave."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status not in (CANCELLED, FAILED):
+                self._jobs.move_to_end(key)
+                return job
+            job = AnalysisJob(key, stages, profiler)
+            self._jobs[key] = job
+            self._evict(self._jobs, self.max_jobs, lambda j: j.done)
+        self._executor.submit(job.run, func, *args)
+        return job
+
+    def cancel(self, key):
+        """Annulla il job con questa chiave (se esiste)."""
+        job = self.get(key)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shared(self, key, factory):
+        """Risultato intermedio condiviso tra job (es. l'indice di tutti i clienti), calcolato una volta.
+
+        Con più worker due job possono calcolarlo in parallelo: vale il primo salvato.
+        """
+        with self._lock:
+            if key in self._shared:
+                self._shared.move_to_end(key)
+                return self._shared[key]
+        value = factory()
+        with self._lock:
+            value = self._shared.setdefault(key, value)
+            self._evict(self._shared, self.max_shared)
+        return value
+
+    def has_shared(self, key):
+        with self._lock:
+            return key in self._shared
+
+    @staticmethod
+    def _evict(entries, max_entries, can_evict=lambda value: True):
+        """Rimuove le voci meno recenti oltre max_entries (solo quelle rimovibili)."""
+        for key in list(entries):
+            if len(entries) <= max_entries:
+                break
+            if can_evict(entries[key]):
+                del entries[key]
+
+    def shutdown(self, cancel=True):
+        """Ferma il pool (annullando i job in corso se cancel=True)."""
+        if cancel:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel()
+        self._executor.shutdown(wait=True)
+
+def run_analysis(job, manager, data_key, df_clean, client, incremental=False):
+    """Analisi completa di un cliente (o di tutti) come job: metriche, indice, coorte, regolarità.
+
+    Metriche e indice di tutti i clienti sono condivisi tra i job dello stesso
+    input (data_key): cambiare cliente non li ricalcola. In modalità
+    incrementale le metriche sono già nell'archivio.
+    Restituisce {'indice': ClientIndex, 'righe': notti del cliente, 'riepilogo': conteggi e medie}.
+    """
+    def build_index():
+        with job.stage('metriche', rows=len(df_clean)):
+            if incremental:
+                df_results = df_clean
+            else:
+                df_results = SleepCalculator(profiler=job).process_dataframe(df_clean)
+        with job.stage('indice_clienti', rows=len(df_results)):
+            return ClientIndex(df_results)
+
+    index_key = ('indice', data_key, incremental)
+    if manager.has_shared(index_key):
+        job.skip('metriche', 'indice_clienti')
+    index = manager.shared(index_key, build_index)
+
+    with job.stage('statistiche_coorte', rows=len(index)):
+        index.cohort()
+    with job.stage('regolarita', rows=len(index)):
+        index.regularity()
+    with job.stage('righe_cliente') as record:
+        rows = index.rows(client)
+        record['rows'] = len(rows)
+
+    return {'indice': index, 'righe': rows, 'riepilogo': index.summary(client)}
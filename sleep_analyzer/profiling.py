@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger('sleep_analyzer.profiling')
+
+def enable_logging(level=logging.INFO, stream=None):
+    """Mostra i log JSON delle fasi (di default su stderr): senza handler il logging li scarta.
+
+    Aggiunge un solo handler anche se chiamata più volte (es. a ogni rerun di Streamlit).
+    """
+    logger.setLevel(level)
+    if not any(getattr(handler, '_sleep_analyzer', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler._sleep_analyzer = True
+        logger.addHandler(handler)
+    return logger
+
+def current_rss_mb():
+    """Memoria residente attuale del processo (MB), se misurabile."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return None
+
+class StageProfiler:
+    """Misura tempo, righe/s e variazione di memoria di ogni fase della pipeline.
+
+    Disattivato di default (costo nullo). Le fasi si annidano: una fase aperta
+    dentro un'altra ne diventa figlia (es. 'clean_data/orari'). Ogni fase chiusa
+    è salvata in `records` ed emessa come log JSON (livello INFO) su
+    'sleep_analyzer.profiling': per vederli serve un handler, vedi enable_logging.
+    """
+
+    def __init__(self, enabled=True, log=True):
+        self.enabled = enabled
+        self.log = log
+        self.records = []
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Misura il blocco di codice come fase `name` (rows: righe elaborate).
+
+        Restituisce il record della fase: chi conosce le righe solo alla fine
+        può impostare record['rows'] dentro il blocco.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        self._stack.append(name)
+        # Il record è inserito all'apertura: `records` resta in ordine di inizio (madre prima delle figlie)
+        record = {'stage': '/'.join(self._stack), 'depth': len(self._stack) - 1, 'rows': rows}
+        self.records.append(record)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            rss_after = current_rss_mb()
+            self._stack.pop()
+
+            record['seconds'] = round(seconds, 4)
+            rows = record['rows']
+            record['rows_per_sec'] = round(rows / seconds, 1) if rows and seconds > 0 else None
+            record['memory_delta_mb'] = (
+                round(rss_after - rss_before, 2) if rss_before is not None and rss_after is not None else None
+            )
+            if self.log:
+                logger.info(json.dumps(record))
+
+    def reset(self):
+        self.records = []
+
+    def to_frame(self):
+        """Fasi misurate, in ordine di inizio."""
+        import pandas as pd
+
+        return pd.DataFrame(self.records, columns=['stage', 'depth', 'rows', 'seconds', 'rows_per_sec', 'memory_delta_mb'])
+
+# Profiler disattivato usato quando il chiamante non ne passa uno
+NULL_PROFILER = StageProfiler(enabled=False, log=False)
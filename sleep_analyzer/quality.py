@@ -0,0 +1,109 @@
+"""Codici di qualità dei dati: perché un valore è stato scartato o corretto.
+
+I codici sono colonne categoriche (1 byte per riga) prodotte insieme ai valori:
+il cleaner li legge dalla stessa tabella di lookup dei valori distinti, il
+calcolatore dalle stesse maschere usate per gli outlier.
+"""
+import numpy as np
+import pandas as pd
+
+# Esiti del parsing di un orario
+TIME_REASONS = ['ok', 'mancante', 'non_interpretabile', 'refuso_corretto']
+
+# Esiti del parsing di una durata (latenza, veglia)
+DURATION_REASONS = ['ok', 'mancante', 'non_interpretabile', 'non_affidabile', 'oltre_120_min']
+
+# Esiti di una metrica calcolata (TIB, TST)
+METRIC_REASONS = ['ok', 'mancante', 'fuori_range']
+
+# Colonna pulita → colonna dell'esito
+TIME_REASON_COLUMNS = {
+    'ora_letto_clean': 'esito_ora_letto',
+    'ora_spento_luci_clean': 'esito_ora_spento_luci',
+    'ora_sveglia_finale_clean': 'esito_ora_sveglia_finale',
+    'ora_alzato_clean': 'esito_ora_alzato',
+}
+DURATION_REASON_COLUMNS = {
+    'latenza_minuti': 'esito_latenza',
+    'veglia_infrasonno_minuti': 'esito_veglia_notte',
+}
+METRIC_REASON_COLUMNS = {
+    'tempo_totale_a_letto_ore': 'esito_tib',
+    'durata_sonno_ore': 'esito_tst',
+}
+
+REASON_CATEGORIES = {
+    **{col: TIME_REASONS for col in TIME_REASON_COLUMNS.values()},
+    **{col: DURATION_REASONS for col in DURATION_REASON_COLUMNS.values()},
+    **{col: METRIC_REASONS for col in METRIC_REASON_COLUMNS.values()},
+}
+REASON_COLUMNS = list(REASON_CATEGORIES)
+
+# Conteggi del report di qualità → (colonna esito, codice) sommati
+QUALITY_COUNTS = {
+    'orari_non_interpretabili': [(col, 'non_interpretabile') for col in TIME_REASON_COLUMNS.values()],
+    'refusi_corretti': [(col, 'refuso_corretto') for col in TIME_REASON_COLUMNS.values()],
+    'durate_non_interpretabili': [
+        (col, code) for col in DURATION_REASON_COLUMNS.values() for code in ('non_interpretabile', 'non_affidabile')
+    ],
+    'latenza_oltre_120': [('esito_latenza', 'oltre_120_min')],
+    'veglia_oltre_120': [('esito_veglia_notte', 'oltre_120_min')],
+    'tib_fuori_range': [('esito_tib', 'fuori_range')],
+    'tst_fuori_range': [('esito_tst', 'fuori_range')],
+}
+
+# Etichette dei conteggi per l'interfaccia
+QUALITY_LABELS = {
+    'orari_non_interpretabili': 'Orari non interpretabili',
+    'refusi_corretti': 'Refusi corretti',
+    'durate_non_interpretabili': 'Durate non interpretabili',
+    'latenza_oltre_120': 'Latenza > 120 min',
+    'veglia_oltre_120': 'WASO > 120 min',
+    'tib_fuori_range': 'TIB fuori range',
+    'tst_fuori_range': 'TST fuori range',
+}
+
+def reason_series(codes, column, index=None):
+    """Colonna categorica dell'esito dai codici interi (posizioni in REASON_CATEGORIES[column])."""
+    return pd.Series(
+        pd.Categorical.from_codes(np.asarray(codes, dtype='int8'), categories=REASON_CATEGORIES[column]),
+        index=index
+    )
+
+def as_reason(values, column):
+    """Esiti letti da un archivio o da un file (testo) come colonna categorica."""
+    return pd.Series(values).astype(pd.CategoricalDtype(REASON_CATEGORIES[column]))
+
+def quality_counts(df, group=None, n_groups=1):
+    """Conteggi del report di qualità per gruppo (array di lunghezza n_groups per ogni voce).
+
+    group: codice di gruppo di ogni riga (es. cliente); None = un solo gruppo.
+    """
+    if group is None:
+        group = np.zeros(len(df), dtype='int64')
+    counts = {}
+    for label, sources in QUALITY_COUNTS.items():
+        mask = np.zeros(len(df), dtype=bool)
+        for column, code in sources:
+            if column in df.columns:
+                values = df[column]
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = as_reason(values.to_numpy(), column)
+                codes = values.cat.codes.to_numpy()
+                mask |= codes == REASON_CATEGORIES[column].index(code)
+        counts[label] = np.bincount(group[mask], minlength=n_groups)
+    return counts
+
+def quality_report(df, client_col='nome_cliente_normalizzato'):
+    """Tabella dei conteggi di qualità per cliente (una riga per cliente, più il totale)."""
+    codes, clients = pd.factorize(df[client_col].astype(object), sort=True)
+    kept = codes >= 0
+    counts = quality_counts(df[kept], codes[kept], len(clients))
+
+    report = pd.DataFrame({client_col: [str(c) for c in clients], 'notti': np.bincount(codes[kept], minlength=len(clients))})
+    for label, values in counts.items():
+        report[label] = values
+
+    total = report.drop(columns=client_col).sum().to_dict()
+    total[client_col] = 'Totale'
+    return pd.concat([report, pd.DataFrame([total])], ignore_index=True)
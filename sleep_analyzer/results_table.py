@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# Colonne della tabella "Dati Elaborati" → intestazioni visualizzate
+DISPLAY_COLUMNS = {
+    'nome_cliente_normalizzato': 'Cliente',
+    'data_compilazione': 'Data',
+    'tempo_totale_a_letto_ore': 'TIB (ore)',
+    'durata_sonno_ore': 'TST (ore)',
+    'efficienza_sonno': 'Efficienza (%)',
+    'tempo_sveglio_letto_ore': 'Tempo Sveglio (ore)',
+    'latenza_minuti': 'Latenza (min)',
+    'veglia_infrasonno_minuti': 'WASO (min)',
+    'media_rolling_7gg_tib': 'TIB Media 7gg',
+    'media_rolling_7gg_durata': 'TST Media 7gg',
+    'media_rolling_7gg_efficienza': 'Eff Media 7gg',
+}
+
+PAGE_SIZES = [25, 50, 100, 500]
+
+def display_columns(df):
+    """Colonne visualizzabili presenti nei risultati."""
+    return [c for c in DISPLAY_COLUMNS if c in df.columns]
+
+def page_count(n_rows, page_size):
+    """Numero di pagine (almeno una, anche senza righe)."""
+    return max(1, -(-n_rows // page_size))
+
+def sort_order(df, column=None, ascending=True):
+    """Posizioni delle righe ordinate per colonna (stabile, mancanti in fondo).
+
+    Senza colonna restituisce l'ordine attuale. Si ordinano solo le posizioni:
+    il dataframe non viene copiato.
+    """
+    if column is None:
+        return np.arange(len(df))
+    values = df[column].reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Nomi categorici: ordine alfabetico, non quello delle categorie
+        values = values.cat.reorder_categories(sorted(values.cat.categories))
+    return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+def format_page(df, positions, page, page_size):
+    """Righe della pagina (numerata da 1) pronte per st.dataframe.
+
+    La formattazione (data, arrotondamenti, intestazioni) riguarda solo le
+    righe visibili.
+    """
+    start = (page - 1) * page_size
+    df_page = df.take(positions[start:start + page_size])[display_columns(df)]
+
+    df_page = df_page.copy()
+    if 'data_compilazione' in df_page.columns:
+        df_page['data_compilazione'] = pd.to_datetime(df_page['data_compilazione']).dt.strftime('%Y-%m-%d')
+    for col in df_page.columns:
+        if pd.api.types.is_float_dtype(df_page[col]):
+            df_page[col] = df_page[col].round(2)
+
+    return df_page.rename(columns=DISPLAY_COLUMNS).reset_index(drop=True)
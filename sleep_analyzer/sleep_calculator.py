@@ -0,0 +1,411 @@
+import numpy as np
+import pandas as pd
+
+from .profiling import NULL_PROFILER
+from .quality import METRIC_REASONS, METRIC_REASON_COLUMNS, as_reason, reason_series
+
+# Colonne delle medie rolling → colonna metrica di origine
+ROLLING_COLUMNS = {
+    'media_rolling_7gg_durata': 'durata_sonno_ore',
+    'media_rolling_7gg_efficienza': 'efficienza_sonno',
+    'media_rolling_7gg_tib': 'tempo_totale_a_letto_ore',
+}
+
+# Metriche di regolarità per cliente (calculate_regularity)
+REGULARITY_COLUMNS = [
+    'ora_letto_media',          # minuti dalla mezzanotte (media circolare)
+    'ora_letto_dev_std_min',    # deviazione standard circolare, minuti
+    'ora_sveglia_media',
+    'ora_sveglia_dev_std_min',
+    'jetlag_sociale_ore',       # metà sonno nel weekend - nei giorni feriali, ore
+    'indice_regolarita',        # Sleep Regularity Index, da -100 a 100
+]
+
+MINUTES_PER_DAY = 24 * 60
+
+# Codici degli esiti delle metriche (posizioni in quality.METRIC_REASONS)
+METRIC_OK, METRIC_MISSING, METRIC_OUT_OF_RANGE = (METRIC_REASONS.index(r) for r in ['ok', 'mancante', 'fuori_range'])
+
+class SleepCalculator:
+    """Calcola metriche del sonno con validazione outlier."""
+
+    def __init__(self, profiler=None):
+        # Profiler opzionale (vedi profiling.StageProfiler): misura le fasi di process_dataframe
+        self.profiler = profiler or NULL_PROFILER
+
+    @staticmethod
+    def time_to_minutes(value):
+        """Minuti dalla mezzanotte da datetime.time o da un orario già in minuti (None se mancante)."""
+        if value is None or pd.isna(value):
+            return None
+        if hasattr(value, 'hour'):
+            return value.hour * 60 + value.minute + value.second / 60
+        return float(value)
+
+    def time_diff_minutes(self, time1, time2):
+        """Calcola differenza gestendo mezzanotte."""
+        minutes1 = self.time_to_minutes(time1)
+        minutes2 = self.time_to_minutes(time2)
+        if minutes1 is None or minutes2 is None:
+            return 0
+
+        # Se time2 <= time1, assume che sia il giorno successivo
+        diff_minutes = minutes2 - minutes1
+        if diff_minutes <= 0:
+            diff_minutes += 24 * 60
+
+        return max(0, diff_minutes)
+
+    def calculate_total_time_in_bed(self, row):
+        """TIB = N - H (ora_alzato - ora_letto)"""
+        return self.total_time_in_bed_detail(row)[0]
+
+    def total_time_in_bed_detail(self, row):
+        """Come calculate_total_time_in_bed, restituendo (ore, codice esito di quality.METRIC_REASONS)."""
+        if self.time_to_minutes(row.get('ora_letto_clean')) is None or self.time_to_minutes(row.get('ora_alzato_clean')) is None:
+            return None, METRIC_MISSING
+
+        tib_minutes = self.time_diff_minutes(row['ora_letto_clean'], row['ora_alzato_clean'])
+        tib_hours = tib_minutes / 60
+
+        # VALIDAZIONE: TIB tra 2 e 20 ore è realistico
+        if tib_hours < 2 or tib_hours > 20:
+            return None, METRIC_OUT_OF_RANGE  # Outlier
+
+        return tib_hours, METRIC_OK
+
+    def calculate_sleep_duration(self, row):
+        """TST = M - I - J - L (ora_sveglia_finale - ora_spento_luci - latenza - veglia)"""
+        return self.sleep_duration_detail(row)[0]
+
+    def sleep_duration_detail(self, row):
+        """Come calculate_sleep_duration, restituendo (ore, codice esito di quality.METRIC_REASONS)."""
+        if self.time_to_minutes(row.get('ora_spento_luci_clean')) is None or self.time_to_minutes(row.get('ora_sveglia_finale_clean')) is None:
+            return None, METRIC_MISSING
+
+        # Tempo base: da spento luci a sveglia finale
+        tempo_base_minutes = self.time_diff_minutes(
+            row['ora_spento_luci_clean'], 
+            row['ora_sveglia_finale_clean']
+        )
+
+        # Sottrai latenza e veglia (mancanti = 0, anche se NaN)
+        latenza = row.get('latenza_minuti', 0)
+        waso = row.get('veglia_infrasonno_minuti', 0)
+        latenza = 0 if pd.isna(latenza) else latenza
+        waso = 0 if pd.isna(waso) else waso
+
+        tst_minutes = tempo_base_minutes - latenza - waso
+        tst_hours = tst_minutes / 60
+
+        # VALIDAZIONE: TST tra 1 e 16 ore è realistico
+        if tst_hours < 1 or tst_hours > 16:
+            return None, METRIC_OUT_OF_RANGE  # Outlier
+
+        return max(0, tst_hours), METRIC_OK
+
+    def calculate_all_metrics(self, row):
+        """Calcola tutte le metriche con validazione (e gli esiti di TIB e TST, come testo)."""
+        metrics = {}
+
+        # TIB
+        metrics['tempo_totale_a_letto_ore'], tib_reason = self.total_time_in_bed_detail(row)
+
+        # TST
+        metrics['durata_sonno_ore'], tst_reason = self.sleep_duration_detail(row)
+
+        # Tempo sveglio
+        tib = metrics['tempo_totale_a_letto_ore']
+        tst = metrics['durata_sonno_ore']
+
+        if tib is not None and tst is not None:
+            metrics['tempo_sveglio_letto_ore'] = max(0, tib - tst)
+
+            # Efficienza
+            if tib > 0:
+                metrics['efficienza_sonno'] = min(100, (tst / tib) * 100)
+            else:
+                metrics['efficienza_sonno'] = None
+        else:
+            metrics['tempo_sveglio_letto_ore'] = None
+            metrics['efficienza_sonno'] = None
+
+        metrics[METRIC_REASON_COLUMNS['tempo_totale_a_letto_ore']] = METRIC_REASONS[tib_reason]
+        metrics[METRIC_REASON_COLUMNS['durata_sonno_ore']] = METRIC_REASONS[tst_reason]
+
+        return metrics
+
+    @staticmethod
+    def minutes_of_day(series):
+        """Converte una colonna di orari (minuti Int16 o datetime.time/None) in minuti dalla mezzanotte (float, NaN se mancante)."""
+        if pd.api.types.is_numeric_dtype(series):
+            return series.to_numpy(dtype='float64', na_value=np.nan)
+
+        # Pochi orari distinti: converti solo i valori unici
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        unique_minutes = np.array(
+            [t.hour * 60 + t.minute + t.second / 60 if hasattr(t, 'hour') else np.nan for t in uniques],
+            dtype='float64'
+        )
+        minutes = np.full(len(series), np.nan)
+        valid = codes >= 0
+        minutes[valid] = unique_minutes[codes[valid]]
+        return minutes
+
+    @staticmethod
+    def time_diff_minutes_array(start, end):
+        """Versione vettoriale di time_diff_minutes: end <= start → giorno successivo."""
+        diff = end - start
+        return np.where(diff <= 0, diff + 24 * 60, diff)
+
+    def calculate_metrics_vectorized(self, df):
+        """Calcola TIB, TST, tempo sveglio ed efficienza su tutto il dataframe con operazioni su array.
+
+        Restituisce anche gli esiti di TIB e TST (esito_tib, esito_tst: ok, mancante, fuori_range).
+        """
+        n = len(df)
+
+        def column_minutes(name):
+            if name not in df.columns:
+                return np.full(n, np.nan)
+            return self.minutes_of_day(df[name])
+
+        def column_values(name):
+            if name not in df.columns:
+                return np.zeros(n)
+            return pd.to_numeric(df[name], errors='coerce').fillna(0).to_numpy(dtype='float64')
+
+        # TIB = N - H
+        tib = self.time_diff_minutes_array(
+            column_minutes('ora_letto_clean'), column_minutes('ora_alzato_clean')
+        ) / 60
+        tib_reason = self.metric_reasons(tib, (tib < 2) | (tib > 20))
+        tib[(tib < 2) | (tib > 20)] = np.nan  # Outlier
+
+        # TST = M - I - J - L
+        tempo_base = self.time_diff_minutes_array(
+            column_minutes('ora_spento_luci_clean'), column_minutes('ora_sveglia_finale_clean')
+        )
+        tst = (tempo_base - column_values('latenza_minuti') - column_values('veglia_infrasonno_minuti')) / 60
+        tst_reason = self.metric_reasons(tst, (tst < 1) | (tst > 16))
+        tst[(tst < 1) | (tst > 16)] = np.nan  # Outlier
+
+        # Tempo sveglio ed efficienza (NaN si propaga se TIB o TST mancano)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sveglio = np.maximum(tib - tst, 0)
+            efficienza = np.minimum(tst / tib * 100, 100)
+        efficienza[~(tib > 0)] = np.nan
+
+        return pd.DataFrame({
+            'tempo_totale_a_letto_ore': tib,
+            'durata_sonno_ore': tst,
+            'tempo_sveglio_letto_ore': sveglio,
+            'efficienza_sonno': efficienza,
+            METRIC_REASON_COLUMNS['tempo_totale_a_letto_ore']: reason_series(tib_reason, 'esito_tib', df.index),
+            METRIC_REASON_COLUMNS['durata_sonno_ore']: reason_series(tst_reason, 'esito_tst', df.index),
+        }, index=df.index)
+
+    @staticmethod
+    def metric_reasons(values, out_of_range):
+        """Codici esito di una metrica (quality.METRIC_REASONS) dalle maschere già usate per gli outlier."""
+        return np.select([np.isnan(values), out_of_range], [METRIC_MISSING, METRIC_OUT_OF_RANGE], METRIC_OK)
+
+    def calculate_rolling_averages(self, df, window=7, group_col='nome_cliente_normalizzato', calendar_days=False):
+        """Medie rolling per cliente in un solo passaggio groupby-rolling.
+
+        Con calendar_days=True la finestra copre gli ultimi `window` giorni di
+        calendario di data_compilazione invece delle ultime `window` righe.
+        Il dataframe deve essere già ordinato per data.
+        """
+        n = len(df)
+        values = df[list(ROLLING_COLUMNS.values())].astype('float64')
+
+        # Chiave di gruppo: un solo gruppo se manca la colonna cliente (nomi mancanti = gruppo a sé)
+        if group_col in df.columns:
+            codes = pd.factorize(df[group_col], use_na_sentinel=False)[0]
+        else:
+            codes = np.zeros(n, dtype='int64')
+
+        valid = np.ones(n, dtype=bool)
+        if calendar_days:
+            dates = pd.to_datetime(df['data_compilazione']).dt.normalize()
+            valid = dates.notna().to_numpy()
+
+        # Ordina per cliente mantenendo l'ordine cronologico: l'output del groupby segue lo stesso ordine
+        positions = np.flatnonzero(valid)
+        order = positions[np.argsort(codes[positions], kind='stable')]
+        sorted_values = values.iloc[order]
+
+        if calendar_days:
+            sorted_values.index = pd.DatetimeIndex(dates.to_numpy()[order])
+            rolled = sorted_values.groupby(codes[order], sort=True).rolling(f'{window}D', min_periods=1).mean()
+        else:
+            sorted_values = sorted_values.reset_index(drop=True)
+            rolled = sorted_values.groupby(codes[order], sort=True).rolling(window=window, min_periods=1).mean()
+
+        result = pd.DataFrame(np.nan, index=df.index, columns=list(ROLLING_COLUMNS))
+        for rolling_col, source_col in ROLLING_COLUMNS.items():
+            column = np.full(n, np.nan)
+            column[order] = rolled[source_col].to_numpy()
+            result[rolling_col] = column
+
+        return result
+
+    @staticmethod
+    def circular_stats(minutes, group, k):
+        """Media e deviazione standard circolari (minuti) degli orari per gruppo.
+
+        Gli orari sono angoli sul quadrante di 24 ore: 23:50 e 00:10 hanno media
+        00:00 e deviazione di circa 10 minuti. NaN esclusi; NaN per i gruppi vuoti.
+        """
+        finite = ~np.isnan(minutes)
+        angles = minutes[finite] * (2 * np.pi / MINUTES_PER_DAY)
+        g = group[finite]
+        n = np.bincount(g, minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c = np.bincount(g, weights=np.cos(angles), minlength=k) / n
+            s = np.bincount(g, weights=np.sin(angles), minlength=k) / n
+            mean = np.mod(np.arctan2(s, c) * (MINUTES_PER_DAY / (2 * np.pi)), MINUTES_PER_DAY)
+            mean[np.isclose(mean, MINUTES_PER_DAY)] = 0  # angoli appena sotto lo zero (arrotondamento)
+            # Lunghezza del vettore medio R: deviazione circolare sqrt(-2 ln R)
+            r = np.minimum(np.hypot(c, s), 1.0)
+            std = np.sqrt(-2 * np.log(r)) * (MINUTES_PER_DAY / (2 * np.pi))
+        mean[n == 0] = np.nan
+        std[n == 0] = np.nan
+        return mean, std
+
+    @staticmethod
+    def circular_overlap(start_a, length_a, start_b, length_b):
+        """Minuti in comune tra due intervalli sul quadrante di 24 ore (inizio in [0, 1440), durata < 1440)."""
+        end_a = start_a + length_a
+        overlap = np.zeros(len(start_a))
+        # Il secondo intervallo spostato di un giorno indietro, nessuno, uno avanti copre tutti gli incroci
+        for shift in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY):
+            b0 = start_b + shift
+            overlap += np.maximum(0, np.minimum(end_a, b0 + length_b) - np.maximum(start_a, b0))
+        return overlap
+
+    def calculate_regularity(self, df, group_col='nome_cliente_normalizzato'):
+        """Metriche di regolarità degli orari per cliente (REGULARITY_COLUMNS), senza cicli sui clienti.
+
+        - orari medi e deviazioni circolari di ora a letto e risveglio finale;
+        - jetlag sociale: spostamento della metà del sonno tra notti del weekend
+          (risveglio di sabato o domenica, data di compilazione) e notti feriali;
+        - Sleep Regularity Index: probabilità (scalata da -100 a 100) di essere
+          nello stesso stato, sonno o veglia, alla stessa ora di due giorni
+          consecutivi; dal diario il sonno va dall'addormentamento (spegnimento
+          luci + latenza) al risveglio finale.
+
+        Usa solo le notti con TST valido. Restituisce una riga per cliente.
+        """
+        n = len(df)
+
+        def column_minutes(name):
+            if name not in df.columns:
+                return np.full(n, np.nan)
+            return self.minutes_of_day(df[name])
+
+        codes, clients = pd.factorize(df[group_col].astype(object), sort=True)
+        k = len(clients)
+        dates = pd.to_datetime(df['data_compilazione'], errors='coerce')
+        days = dates.dt.normalize().to_numpy()
+
+        valid = (codes >= 0) & ~np.isnat(days)
+        if 'durata_sonno_ore' in df.columns:
+            valid &= df['durata_sonno_ore'].notna().to_numpy()
+
+        # Notti valide ordinate per cliente e data
+        positions = np.flatnonzero(valid)
+        positions = positions[np.lexsort((days[positions], codes[positions]))]
+        group = codes[positions]
+        days = days[positions]
+
+        bedtime = column_minutes('ora_letto_clean')[positions]
+        wake = column_minutes('ora_sveglia_finale_clean')[positions]
+        bed_mean, bed_std = self.circular_stats(bedtime, group, k)
+        wake_mean, wake_std = self.circular_stats(wake, group, k)
+
+        # Intervallo di sonno: addormentamento → risveglio finale
+        latency = np.zeros(len(positions))
+        if 'latenza_minuti' in df.columns:
+            latency = pd.to_numeric(df['latenza_minuti'], errors='coerce').fillna(0).to_numpy(dtype='float64')[positions]
+        onset = np.mod(column_minutes('ora_spento_luci_clean')[positions] + latency, MINUTES_PER_DAY)
+        length = self.time_diff_minutes_array(onset, wake)
+
+        # Jetlag sociale: differenza circolare tra le metà del sonno medie, in (-12, 12] ore
+        mid_sleep = np.mod(onset + length / 2, MINUTES_PER_DAY)
+        weekend = pd.DatetimeIndex(days).dayofweek.to_numpy() >= 5
+        mid_free, _ = self.circular_stats(np.where(weekend, mid_sleep, np.nan), group, k)
+        mid_work, _ = self.circular_stats(np.where(weekend, np.nan, mid_sleep), group, k)
+        shift = np.mod(mid_free - mid_work + MINUTES_PER_DAY / 2, MINUTES_PER_DAY) - MINUTES_PER_DAY / 2
+
+        # SRI: coppie di notti dello stesso cliente a un giorno di distanza
+        pair = np.flatnonzero(
+            (group[1:] == group[:-1]) & (days[1:] - days[:-1] == np.timedelta64(1, 'D'))
+        )
+        pair = pair[~(np.isnan(onset[pair]) | np.isnan(length[pair])
+                      | np.isnan(onset[pair + 1]) | np.isnan(length[pair + 1]))]
+        overlap = self.circular_overlap(onset[pair], length[pair], onset[pair + 1], length[pair + 1])
+        # Minuti con stato diverso = differenza simmetrica dei due intervalli
+        agreement = 1 - (length[pair] + length[pair + 1] - 2 * overlap) / MINUTES_PER_DAY
+        pair_group = group[pair]
+        n_pairs = np.bincount(pair_group, minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sri = -100 + 200 * np.bincount(pair_group, weights=agreement, minlength=k) / n_pairs
+
+        return pd.DataFrame({
+            group_col: [str(c) for c in clients],
+            'ora_letto_media': bed_mean,
+            'ora_letto_dev_std_min': bed_std,
+            'ora_sveglia_media': wake_mean,
+            'ora_sveglia_dev_std_min': wake_std,
+            'jetlag_sociale_ore': shift / 60,
+            'indice_regolarita': sri,
+        })
+
+    def process_dataframe(self, df, vectorized=True, rolling_by_client=True, rolling_calendar_days=False):
+        """Processa tutto il dataframe.
+
+        Con vectorized=False usa il calcolo riga per riga (calculate_all_metrics),
+        utile come riferimento per verificare la parità dei risultati.
+        Le medie rolling a 7 giorni sono calcolate per cliente (rolling_by_client)
+        sulle ultime 7 notti, o sugli ultimi 7 giorni di calendario (rolling_calendar_days).
+        """
+        with self.profiler.stage('process_dataframe', rows=len(df)):
+            # Ordina per data (l'ordinamento crea già un nuovo dataframe: nessuna copia aggiuntiva)
+            if 'data_compilazione' in df.columns:
+                df = df.sort_values('data_compilazione', ascending=True).reset_index(drop=True)
+            else:
+                df = df.copy(deep=False)
+
+            # Calcola metriche
+            with self.profiler.stage('metriche', rows=len(df)):
+                if vectorized:
+                    metrics_df = self.calculate_metrics_vectorized(df)
+                else:
+                    metrics_list = []
+                    for idx, row in df.iterrows():
+                        metrics = self.calculate_all_metrics(row)
+                        metrics_list.append(metrics)
+                    metrics_df = pd.DataFrame(metrics_list, columns=[
+                        'tempo_totale_a_letto_ore', 'durata_sonno_ore', 'tempo_sveglio_letto_ore', 'efficienza_sonno',
+                        *METRIC_REASON_COLUMNS.values()
+                    ])
+                    # Esiti come colonne categoriche, come nel calcolo vettoriale
+                    for reason_col in METRIC_REASON_COLUMNS.values():
+                        metrics_df[reason_col] = as_reason(metrics_df[reason_col], reason_col)
+
+                for col in metrics_df.columns:
+                    df[col] = metrics_df[col]
+
+            # MEDIE ROLLING CON min_periods=1 (usa solo dati disponibili!)
+            if 'data_compilazione' in df.columns:
+                with self.profiler.stage('medie_rolling', rows=len(df)):
+                    group_col = 'nome_cliente_normalizzato' if rolling_by_client else None
+                    rolling_df = self.calculate_rolling_averages(
+                        df, window=7, group_col=group_col, calendar_days=rolling_calendar_days
+                    )
+                    for col in rolling_df.columns:
+                        df[col] = rolling_df[col]
+
+        return df
@@ -0,0 +1,297 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from .data_cleaner import SleepDataCleaner, TIME_COLUMNS, column_map
+from .sleep_calculator import SleepCalculator, ROLLING_COLUMNS
+from .quality import REASON_COLUMNS, as_reason
+
+# Colonne di input usate per l'impronta della riga (Start time, Nome e Cognome)
+FINGERPRINT_COLUMNS = ['data_compilazione', 'nome_cliente']
+
+METRIC_COLUMNS = ['tempo_totale_a_letto_ore', 'durata_sonno_ore', 'tempo_sveglio_letto_ore', 'efficienza_sonno']
+
+STORED_COLUMNS = (
+    ['fingerprint', 'nome_cliente_normalizzato', 'data_compilazione']
+    + TIME_COLUMNS
+    + ['latenza_minuti', 'veglia_infrasonno_minuti']
+    + METRIC_COLUMNS
+    + REASON_COLUMNS
+    + list(ROLLING_COLUMNS)
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS notti (
+    fingerprint INTEGER PRIMARY KEY,
+    nome_cliente_normalizzato TEXT,
+    data_compilazione TEXT,
+    {', '.join(f'{col} INTEGER' for col in TIME_COLUMNS)},
+    latenza_minuti REAL,
+    veglia_infrasonno_minuti REAL,
+    {', '.join(f'{col} REAL' for col in METRIC_COLUMNS)},
+    {', '.join(f'{col} TEXT' for col in REASON_COLUMNS)},
+    {', '.join(f'{col} REAL' for col in ROLLING_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_notti_cliente_data ON notti (nome_cliente_normalizzato, data_compilazione);
+CREATE TABLE IF NOT EXISTS caricamenti (
+    hash TEXT PRIMARY KEY,
+    nome_file TEXT,
+    righe INTEGER,
+    nuove INTEGER,
+    caricato_il TEXT
+);
+"""
+
+class SleepStateStore:
+    """Archivio locale (SQLite) delle righe pulite e delle metriche già calcolate.
+
+    Ogni riga è identificata da un'impronta di Start time + Nome: a ogni nuovo
+    caricamento vengono pulite e calcolate solo le righe mai viste prima.
+
+    Le notti sono indicizzate per (cliente, data): le letture per cliente e
+    periodo (query) sono intervalli dell'indice, filtrati da SQLite senza
+    caricare il resto dell'archivio. I file già archiviati sono registrati per
+    hash del contenuto, così un nuovo caricamento dello stesso file non va riletto.
+    """
+
+    def __init__(self, path='sleep_state.sqlite', cleaner=None, calculator=None):
+        self.path = path
+        self.cleaner = cleaner or SleepDataCleaner()
+        self.calculator = calculator or SleepCalculator()
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        """Aggiunge agli archivi creati da versioni precedenti le colonne degli esiti (vuote)."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(notti)")}
+        for col in REASON_COLUMNS:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE notti ADD COLUMN {col} TEXT")
+
+    @contextmanager
+    def _connect(self):
+        """Connessione all'archivio: commit a fine blocco (rollback se errore), poi chiusa."""
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def row_fingerprint(df):
+        """Impronta (int64) di ogni riga calcolata su Start time e Nome."""
+        col_map = column_map(df)
+        key = df.iloc[:, [col_map[col] for col in FINGERPRINT_COLUMNS]].astype(str)
+        return pd.util.hash_pandas_object(key, index=False).to_numpy().view('int64')
+
+    @staticmethod
+    def _temp_table(conn, name, columns, rows):
+        """Tabella temporanea (della sola connessione) con le righe indicate, per i join con notti."""
+        conn.execute(f"DROP TABLE IF EXISTS temp.{name}")
+        conn.execute(f"CREATE TEMP TABLE {name} ({', '.join(columns)})")
+        conn.executemany(f"INSERT INTO temp.{name} VALUES ({', '.join('?' for _ in columns)})", rows)
+
+    def stored_fingerprints(self, fingerprints):
+        """Impronte tra quelle indicate già presenti nell'archivio.
+
+        Si cercano solo le impronte del file (join sulla chiave primaria), non
+        tutte quelle archiviate: il costo non cresce con la dimensione dell'archivio.
+        """
+        with self._connect() as conn:
+            self._temp_table(conn, 'impronte', ['fingerprint INTEGER PRIMARY KEY'],
+                             [(int(fp),) for fp in np.unique(fingerprints)])
+            rows = conn.execute(
+                "SELECT n.fingerprint FROM temp.impronte i JOIN notti n ON n.fingerprint = i.fingerprint"
+            ).fetchall()
+        return np.array([r[0] for r in rows], dtype='int64')
+
+    def upload(self, file_hash):
+        """Dati del caricamento già archiviato con questo hash (None se il file non è mai stato archiviato)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT hash, nome_file, righe, nuove, caricato_il FROM caricamenti WHERE hash = ?", (file_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['hash', 'nome_file', 'righe', 'nuove', 'caricato_il'], row))
+
+    def revision(self):
+        """Numero di caricamenti archiviati: cambia a ogni ingest registrato (chiave per le cache)."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM caricamenti").fetchone()[0]
+
+    def _record_upload(self, file_hash, file_name, rows, new_rows):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO caricamenti VALUES (?, ?, ?, ?, ?)",
+                (file_hash, file_name, rows, new_rows, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def ingest(self, df_raw, file_hash=None, file_name=None):
+        """Pulisce e calcola solo le righe nuove del file, poi le archivia.
+
+        file_hash: hash del contenuto del file; se indicato il caricamento viene
+        registrato (vedi upload). Restituisce il numero di righe nuove archiviate.
+        """
+        n_new = self._ingest(df_raw)
+        if file_hash is not None:
+            self._record_upload(file_hash, file_name, len(df_raw), n_new)
+        return n_new
+
+    def _ingest(self, df_raw):
+        fingerprints = self.row_fingerprint(df_raw)
+
+        # Righe nuove (se ripetute nello stesso file vale l'ultima)
+        is_new = ~pd.Series(fingerprints).duplicated(keep='last').to_numpy()
+        is_new &= ~np.isin(fingerprints, self.stored_fingerprints(fingerprints))
+        if not is_new.any():
+            return 0
+
+        df_new = self.cleaner.clean_data(df_raw[is_new])
+        df_new['fingerprint'] = fingerprints[is_new]
+
+        metrics_df = self.calculator.calculate_metrics_vectorized(df_new)
+        for col in metrics_df.columns:
+            df_new[col] = metrics_df[col]
+
+        # Medie rolling: riparti dalle ultime notti già archiviate di ogni cliente
+        context = self._rolling_context(df_new)
+        combined = pd.concat([context, df_new[STORED_COLUMNS[:-len(ROLLING_COLUMNS)]]], ignore_index=True)
+        combined['_ricalcola'] = combined['_ricalcola'].astype('boolean').fillna(False).astype(bool)
+        combined = combined.sort_values('data_compilazione', ascending=True, kind='stable').reset_index(drop=True)
+        rolling_df = self.calculator.calculate_rolling_averages(combined)
+        for col in rolling_df.columns:
+            combined[col] = rolling_df[col]
+
+        # Righe da scrivere: quelle nuove e quelle di storico con medie ricalcolate
+        to_write = combined[combined['fingerprint'].isin(df_new['fingerprint']) | combined['_ricalcola']]
+        self._write(to_write)
+
+        return int(is_new.sum())
+
+    def _rolling_context(self, df_new):
+        """Notti archiviate necessarie per aggiornare le medie rolling dei clienti coinvolti.
+
+        Di norma bastano le ultime 6 notti di ciascun cliente; se arrivano notti
+        precedenti all'ultima archiviata si ricaricano tutte le notti successive.
+        Il filtro è eseguito da SQLite: si leggono solo queste righe, non tutto lo storico.
+        Le notti senza nome cliente non hanno contesto (l'app le scarta comunque).
+        """
+        window = 7
+        first_new = df_new.groupby('nome_cliente_normalizzato', observed=True)['data_compilazione'].min()
+        if first_new.empty:
+            return pd.DataFrame(columns=STORED_COLUMNS + ['_ricalcola'])
+
+        first_text = pd.to_datetime(first_new).dt.strftime('%Y-%m-%dT%H:%M:%S')
+        # Notti successive alla prima nuova (_ricalcola): le loro medie vanno ricalcolate e riscritte;
+        # delle altre servono solo le (window - 1) più recenti
+        query = """
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY nome_cliente_normalizzato, _ricalcola ORDER BY data_compilazione DESC
+                ) AS rn
+                FROM (
+                    SELECT n.*, COALESCE(n.data_compilazione > p.prima, 0) AS _ricalcola
+                    FROM temp.prime_notti p
+                    JOIN notti n ON n.nome_cliente_normalizzato = p.cliente
+                )
+            )
+            WHERE _ricalcola OR rn <= ?
+        """
+        with self._connect() as conn:
+            self._temp_table(conn, 'prime_notti', ['cliente TEXT PRIMARY KEY', 'prima TEXT'],
+                             [(str(c), None if pd.isna(d) else d) for c, d in first_text.items()])
+            stored = pd.read_sql_query(query, conn, params=[window - 1])
+
+        stored = self._to_frame(stored.drop(columns='rn'))
+        stored['_ricalcola'] = stored['_ricalcola'].astype(bool)
+        return stored
+
+    def _write(self, df):
+        """Scrive (o sostituisce) le righe nell'archivio."""
+        out = pd.DataFrame({col: df[col] for col in STORED_COLUMNS})
+        out['data_compilazione'] = pd.to_datetime(out['data_compilazione']).dt.strftime('%Y-%m-%dT%H:%M:%S')
+        for col in TIME_COLUMNS:
+            out[col] = pd.array(self.calculator.minutes_of_day(df[col]), dtype='float64').astype('Int64')
+
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM notti WHERE fingerprint = ?",
+                [(int(fp),) for fp in out['fingerprint']]
+            )
+            out.to_sql('notti', conn, if_exists='append', index=False)
+
+    def _to_frame(self, stored):
+        """Converte le righe lette da SQLite nei tipi compatti del dataframe pulito."""
+        df = stored
+        if 'nome_cliente_normalizzato' in df.columns:
+            df['nome_cliente_normalizzato'] = df['nome_cliente_normalizzato'].astype('category')
+        if 'data_compilazione' in df.columns:
+            df['data_compilazione'] = pd.to_datetime(df['data_compilazione'], errors='coerce')
+        for col in TIME_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int16')
+        for col in ['latenza_minuti', 'veglia_infrasonno_minuti']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        for col in REASON_COLUMNS:
+            if col in df.columns:
+                df[col] = as_reason(df[col].to_numpy(dtype=object), col).array
+        return df
+
+    @staticmethod
+    def _where(client=None, start=None, end=None):
+        """Clausola WHERE (e parametri) per cliente e periodo [start, end], date incluse."""
+        conditions = []
+        params = []
+        if client is not None:
+            clients = [client] if isinstance(client, str) else list(client)
+            conditions.append(f"nome_cliente_normalizzato IN ({', '.join('?' for _ in clients)})")
+            params.extend(clients)
+        # Date salvate come testo ISO: il confronto tra stringhe segue l'ordine cronologico
+        if start is not None:
+            conditions.append("data_compilazione >= ?")
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%dT%H:%M:%S'))
+        if end is not None:
+            conditions.append("data_compilazione < ?")
+            params.append((pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S'))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def query(self, client=None, start=None, end=None, columns=None):
+        """Notti archiviate di uno o più clienti in un periodo, ordinate per data.
+
+        I filtri (e la scelta delle colonne) sono eseguiti da SQLite sull'indice
+        (cliente, data): si leggono solo le righe e le colonne richieste.
+        client: nome o lista di nomi (None = tutti); start, end: date incluse (None = senza limite).
+        """
+        selected = '*' if columns is None else ', '.join(c for c in STORED_COLUMNS if c in columns)
+        where, params = self._where(client, start, end)
+        sql = f"SELECT {selected} FROM notti{where} ORDER BY data_compilazione"
+
+        with self._connect() as conn:
+            stored = pd.read_sql_query(sql, conn, params=params)
+
+        return self._to_frame(stored)
+
+    def partitions(self, client=None, start=None, end=None):
+        """Notti archiviate per cliente e mese (letti dal solo indice, senza le righe)."""
+        where, params = self._where(client, start, end)
+        sql = f"""
+            SELECT nome_cliente_normalizzato, substr(data_compilazione, 1, 7) AS mese, COUNT(*) AS notti
+            FROM notti{where}
+            GROUP BY nome_cliente_normalizzato, mese
+            ORDER BY nome_cliente_normalizzato, mese
+        """
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def load_history(self, client=None):
+        """Storico archiviato (righe pulite e metriche), ordinato per data."""
+        return self.query(client=client)
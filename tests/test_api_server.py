@@ -0,0 +1,82 @@
+"""Servizio di analisi locale: server in background e AnalysisClient, senza rete esterna."""
+import json
+import socket
+
+import pytest
+
+from benchmarks.synthetic_data import generate_diary
+from sleep_analyzer.api_server import AnalysisServer, AnalysisClient
+
+RECORDS = [
+    {
+        'nome_cliente': 'Anna Bianchi', 'data_compilazione': f'2024-01-0{day}', 'ora_letto': '23:00',
+        'ora_spento_luci': '23,15', 'latenza': '15 min', 'num_risvegli': 1, 'veglia_notte': '10',
+        'ora_sveglia_finale': '07:00', 'ora_alzato': '7.30',
+    }
+    for day in range(1, 4)
+]
+
+@pytest.fixture(scope='module')
+def server():
+    server = AnalysisServer(port=0, workers=1).start_background()
+    yield server
+    server.stop_background()
+
+@pytest.fixture
+def client(server):
+    return AnalysisClient(port=server.port, timeout=60)
+
+def raw_request(server, head, body=b''):
+    """Invia una richiesta HTTP scritta a mano; restituisce (stato, corpo JSON)."""
+    with socket.create_connection(('127.0.0.1', server.port), timeout=60) as sock:
+        sock.sendall(head.encode('ascii') + b'\r\n' + body)
+        sock.shutdown(socket.SHUT_WR)
+        response = b''
+        while chunk := sock.recv(65536):
+            response += chunk
+    status_line, _, rest = response.partition(b'\r\n')
+    return int(status_line.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2])
+
+def test_analyze_records(client):
+    result = client.analyze_records(RECORDS, rows=True)
+
+    assert result['clienti'] == ['Anna Bianchi']
+    assert result['notti'] == 3
+    # Letto 23:00 → alzato 7:30 = 8,5 ore; luci 23:15 → sveglia 7:00 - 15 - 10 min = 7,33 ore
+    assert result['riepilogo']['media']['tempo_totale_a_letto_ore'] == pytest.approx(8.5)
+    assert result['riepilogo']['media']['durata_sonno_ore'] == pytest.approx(7 + 1 / 3)
+    assert len(result['risultati']) == 3
+
+def test_analyze_bytes_and_cache(client, server):
+    data = generate_diary(300, n_clients=5, seed=3).to_csv(index=False).encode('utf-8')
+
+    first = client.analyze_bytes(data, 'diario.csv')
+    hits = server.stats['cache_hit']
+    again = client.analyze_bytes(data, 'diario.csv', client=first['clienti'][0])
+
+    assert first['righe_lette'] == 300
+    assert len(first['clienti']) == 5
+    assert again['cliente'] == first['clienti'][0]
+    assert server.stats['cache_hit'] == hits + 1
+
+    # Stessi byte con un'altra estensione: un altro lettore, non il risultato in cache
+    with pytest.raises(RuntimeError, match='400'):
+        client.analyze_bytes(data, 'diario.parquet')
+
+def test_unknown_endpoint_and_client(client):
+    with pytest.raises(RuntimeError, match='404'):
+        client._request('GET', '/sconosciuto')
+    with pytest.raises(RuntimeError, match='404'):
+        client.analyze_records(RECORDS, client='Nessuno')
+
+def test_content_length_errors(server):
+    post = 'POST /analisi HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+    body = json.dumps({'righe': RECORDS}).encode('utf-8')
+
+    assert raw_request(server, post)[0] == 411
+    assert raw_request(server, post + 'Content-Length: abc\r\n')[0] == 400
+    assert raw_request(server, post + 'Content-Length: -1\r\n')[0] == 400
+    # Corpo più corto del Content-Length dichiarato
+    status, payload = raw_request(server, post + f'Content-Length: {len(body) + 100}\r\n', body)
+    assert status == 400 and 'Content-Length' in payload['errore']
+    assert raw_request(server, post + f'Content-Length: {len(body)}\r\n', body)[0] == 200
@@ -0,0 +1,95 @@
+"""ChunkedPipeline a blocchi contro process_dataframe sul file intero."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import generate_diary
+from sleep_analyzer.chunked_pipeline import ChunkedPipeline
+from sleep_analyzer.data_cleaner import SleepDataCleaner
+from sleep_analyzer.sleep_calculator import SleepCalculator, ROLLING_COLUMNS
+
+KEY = ['nome_cliente_normalizzato', 'data_compilazione']
+
+def diary(tmp_path, n_rows=4000, undated=0):
+    """Export sintetico su csv: in ordine di invio, quindi con Start time non monotono nello stesso giorno."""
+    raw = generate_diary(n_rows, n_clients=50, seed=0).drop_duplicates('Start time')
+    raw = raw[raw['Inserisci il tuo Nome e Cognome'].notna()]
+    if undated:
+        # Una notte senza data per cliente diverso
+        first = raw.index[~raw['Inserisci il tuo Nome e Cognome'].str.strip().str.lower().duplicated()][:undated]
+        raw.loc[first, 'Start time'] = pd.NaT
+    path = tmp_path / 'diario.csv'
+    raw.to_csv(path, index=False)
+    return raw, path
+
+def in_memory(raw):
+    full = SleepCalculator().process_dataframe(SleepDataCleaner().clean_data(raw))
+    return full[full['nome_cliente_normalizzato'].notna()]
+
+def chunked(path, **kwargs):
+    pipeline = ChunkedPipeline(**kwargs)
+    parts = [results for _, results in pipeline.iter_results(str(path))]
+    return pipeline, pd.concat(parts, ignore_index=True)
+
+def assert_rolling_equal(expected, actual):
+    expected = expected.assign(nome_cliente_normalizzato=expected['nome_cliente_normalizzato'].astype(str))
+    actual = actual.assign(nome_cliente_normalizzato=actual['nome_cliente_normalizzato'].astype(str))
+    merged = expected.merge(actual, on=KEY, suffixes=('_memoria', '_blocchi'), validate='one_to_one')
+    assert len(merged) == len(expected) == len(actual)
+    for col in ROLLING_COLUMNS:
+        np.testing.assert_allclose(
+            merged[f'{col}_blocchi'].to_numpy(dtype='float64'),
+            merged[f'{col}_memoria'].to_numpy(dtype='float64'),
+            rtol=1e-9, equal_nan=True, err_msg=col
+        )
+
+def test_chunked_rolling_matches_in_memory(tmp_path):
+    raw, path = diary(tmp_path)
+    assert not raw['Start time'].is_monotonic_increasing
+    pipeline, parts = chunked(path, chunk_rows=333)
+
+    assert pipeline.late_rows == 0
+    assert_rolling_equal(in_memory(raw), parts)
+
+def test_out_of_order_within_delay(tmp_path):
+    raw, path = diary(tmp_path, n_rows=1500)
+    # Notti inviate con un giorno di ritardo: spostate più avanti nel file
+    moved = raw.sample(frac=0.1, random_state=1)
+    moved = moved.assign(**{'Start time': moved['Start time'] - pd.Timedelta(days=1)})
+    raw = pd.concat([raw.drop(moved.index), moved]).sort_index(kind='stable')
+    raw = raw.drop_duplicates('Start time')
+    raw.to_csv(path, index=False)
+
+    pipeline, parts = chunked(path, chunk_rows=100)
+    assert pipeline.late_rows == 0
+    assert_rolling_equal(in_memory(raw), parts)
+
+def test_undated_nights_not_carried(tmp_path):
+    raw, path = diary(tmp_path, n_rows=1500, undated=5)
+    _, parts = chunked(path, chunk_rows=200)
+    expected = in_memory(raw)
+
+    undated = parts['data_compilazione'].isna()
+    assert undated.sum() == 5
+    # Le notti senza data vengono scritte per ultime, come in process_dataframe
+    assert undated.to_numpy()[-5:].all()
+    assert_rolling_equal(expected[expected['data_compilazione'].notna()], parts[~undated])
+    pd.testing.assert_frame_equal(undated_rolling(parts), undated_rolling(expected), check_dtype=False)
+
+def undated_rolling(df):
+    """Medie rolling delle notti senza data, per cliente."""
+    undated = df[df['data_compilazione'].isna()]
+    return undated.set_index(undated['nome_cliente_normalizzato'].astype(str).rename('cliente'))[
+        list(ROLLING_COLUMNS)].sort_index()
+
+def test_late_beyond_delay_warns(tmp_path):
+    raw, path = diary(tmp_path, n_rows=1500)
+    # Un'ultima notte datata all'inizio del periodo: le medie già scritte non possono includerla
+    late = raw.iloc[[0]].assign(**{'Start time': raw['Start time'].min() - pd.Timedelta(hours=1)})
+    raw = pd.concat([raw, late], ignore_index=True)
+    raw.to_csv(path, index=False)
+
+    with pytest.warns(RuntimeWarning, match='ritardo'):
+        pipeline, parts = chunked(path, chunk_rows=200)
+    assert pipeline.late_rows == 1
+    assert len(parts) == len(raw)
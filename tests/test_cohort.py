@@ -0,0 +1,58 @@
+"""Statistiche di coorte su casi piccoli calcolati a mano."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sleep_analyzer.cohort import cohort_statistics, group_percentiles, group_slopes, zscores
+
+def test_group_percentiles():
+    values = np.array([4, 10, np.nan, 1, 3, 2], dtype='float64')
+    group = np.array([0, 1, 1, 0, 0, 0])
+    per_group, overall = group_percentiles(values, group, k=3)
+
+    # Gruppo 0: [1, 2, 3, 4] con interpolazione lineare; gruppo 1: [10]; gruppo 2 vuoto
+    np.testing.assert_allclose(per_group[10], [1.3, 10, np.nan], equal_nan=True)
+    np.testing.assert_allclose(per_group[50], [2.5, 10, np.nan], equal_nan=True)
+    np.testing.assert_allclose(per_group[90], [3.7, 10, np.nan], equal_nan=True)
+    # Tutti: [1, 2, 3, 4, 10]
+    assert overall == pytest.approx({10: 1.4, 50: 3.0, 90: 7.6})
+
+def test_group_slopes():
+    # Gruppo 0 sulla retta y = 2x + 1; gruppo 1 con x costante; gruppo 2 vuoto
+    x = np.array([0, 1, 2, 3, 3, np.nan], dtype='float64')
+    y = np.array([1, 3, 5, 7, 7, 100], dtype='float64')
+    group = np.array([0, 0, 0, 1, 1, 1])
+    slopes, overall = group_slopes(x, y, group, k=3)
+
+    np.testing.assert_allclose(slopes, [2, np.nan, np.nan], equal_nan=True)
+    assert overall == pytest.approx(2)
+
+def test_zscores():
+    np.testing.assert_allclose(zscores(np.array([1, 2, 3, np.nan])), [-1, 0, 1, np.nan], equal_nan=True)
+    assert np.isnan(zscores(np.array([5.0, 5.0]))).all()
+
+def test_cohort_statistics():
+    # A: 6, 7, 8 ore a una settimana di distanza (+1 h/settimana); B: 8, 8 ore
+    frame = pd.DataFrame({
+        'data_compilazione': pd.to_datetime(['2024-01-01', '2024-01-08', '2024-01-15', '2024-01-01', '2024-01-08']),
+        'durata_sonno_ore': [6, 7, 8, 8, 8],
+    })
+    group = np.array([0, 0, 0, 1, 1])
+    table = cohort_statistics(frame, group, ['A', 'B'], np.ones(5, dtype=bool)).set_index('nome_cliente_normalizzato')
+
+    assert table.loc['A', 'p50_durata_sonno_ore'] == 7
+    assert table.loc['A', 'p10_durata_sonno_ore'] == pytest.approx(6.2)
+    assert table.loc['Coorte', 'p50_durata_sonno_ore'] == 8
+    assert table.loc['A', 'trend_settimanale_durata_sonno_ore'] == pytest.approx(1)
+    assert table.loc['B', 'trend_settimanale_durata_sonno_ore'] == pytest.approx(0)
+    # Medie 7 e 8 (dev. std 0,7071): z-score ±0,5 / 0,7071
+    assert table.loc['A', 'z_durata_sonno_ore'] == pytest.approx(-np.sqrt(0.5))
+    assert table.loc['B', 'z_durata_sonno_ore'] == pytest.approx(np.sqrt(0.5))
+    assert np.isnan(table.loc['Coorte', 'z_durata_sonno_ore'])
+    # Metriche assenti dal frame: NaN
+    assert table['p50_latenza_minuti'].isna().all()
+
+    # Le notti non valide sono escluse
+    valid = np.array([True, True, False, True, True])
+    table = cohort_statistics(frame, group, ['A', 'B'], valid).set_index('nome_cliente_normalizzato')
+    assert table.loc['A', 'p50_durata_sonno_ore'] == pytest.approx(6.5)
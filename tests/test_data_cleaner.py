@@ -0,0 +1,21 @@
+"""Pulizia parallela contro pulizia seriale di SleepDataCleaner."""
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_diary
+from sleep_analyzer.data_cleaner import SleepDataCleaner
+
+def test_parallel_clean_matches_serial():
+    raw = generate_diary(3000, n_clients=40, seed=11)
+
+    serial = SleepDataCleaner(workers=1).clean_data(raw)
+    # Soglia minima: ogni colonna viene suddivisa tra i processi worker
+    parallel_cleaner = SleepDataCleaner(workers=3, parallel_threshold=1)
+    try:
+        parallel = parallel_cleaner.clean_data(raw)
+        assert parallel_cleaner._executor is not None
+        again = parallel_cleaner.clean_data(raw)
+    finally:
+        parallel_cleaner.close()
+
+    pd.testing.assert_frame_equal(parallel, serial)
+    pd.testing.assert_frame_equal(again, serial)
@@ -0,0 +1,179 @@
+"""Parità tra il calcolo vettoriale e quello riga per riga di SleepCalculator.process_dataframe."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import generate_diary
+from sleep_analyzer.data_cleaner import SleepDataCleaner
+from sleep_analyzer.quality import METRIC_REASON_COLUMNS, quality_counts
+from sleep_analyzer.sleep_calculator import SleepCalculator, ROLLING_COLUMNS
+
+METRIC_COLUMNS = ['tempo_totale_a_letto_ore', 'durata_sonno_ore', 'tempo_sveglio_letto_ore', 'efficienza_sonno']
+
+def hm(hours, minutes=0):
+    return hours * 60 + minutes
+
+# (letto, spento luci, sveglia finale, alzato, latenza, veglia): orari in minuti dalla mezzanotte
+EDGE_ROWS = [
+    (hm(23), hm(23, 10), hm(7), hm(7, 15), 15, 10),        # notte normale, a cavallo della mezzanotte
+    (hm(1), hm(1, 5), hm(9), hm(9, 30), 5, 0),             # tutto dopo la mezzanotte
+    (hm(23), hm(8), hm(8), hm(23), 300, 200),              # letto = alzato, luci = sveglia: 24 ore
+    (hm(22), hm(22), hm(0), hm(0), 0, 0),                  # TIB e TST esattamente 2 ore
+    (hm(22), hm(22), hm(23, 59), hm(23, 59), 0, 0),        # TIB appena sotto 2 ore
+    (hm(3), hm(3), hm(23), hm(23), 0, 0),                  # TIB esattamente 20 ore, TST 20 ore
+    (hm(3), hm(3), hm(23, 1), hm(23, 1), 0, 0),            # TIB appena sopra 20 ore
+    (hm(23), hm(23), hm(0), hm(8), 0, 0),                  # TST esattamente 1 ora
+    (hm(23), hm(23), hm(0), hm(8), 1, 0),                  # TST appena sotto 1 ora
+    (hm(20), hm(20), hm(12), hm(12), 0, 0),                # TST esattamente 16 ore
+    (hm(20), hm(20), hm(12, 1), hm(12, 1), 0, 0),          # TST appena sopra 16 ore
+    (hm(23), hm(23), hm(7), hm(7), 600, 0),                # latenza oltre il tempo a letto
+    (None, hm(23), hm(7), hm(7), 10, 0),                   # ora a letto mancante
+    (hm(23), None, hm(7), hm(7), 10, 0),                   # spegnimento luci mancante
+    (hm(23), hm(23), None, None, 10, 0),                   # risvegli mancanti
+    (hm(23), hm(23), hm(7), hm(7), None, None),            # latenza e veglia mancanti
+    (None, None, None, None, None, None),                  # notte vuota
+]
+
+def edge_frame():
+    """Dataframe pulito (come l'output di SleepDataCleaner) con i casi limite, su due clienti."""
+    columns = ['ora_letto_clean', 'ora_spento_luci_clean', 'ora_sveglia_finale_clean', 'ora_alzato_clean',
+               'latenza_minuti', 'veglia_infrasonno_minuti']
+    df = pd.DataFrame(EDGE_ROWS * 2, columns=columns)
+    for col in columns[:4]:
+        df[col] = df[col].astype('Int16')
+    for col in columns[4:]:
+        df[col] = df[col].astype('float32')
+    n = len(EDGE_ROWS)
+    df['nome_cliente_normalizzato'] = pd.Categorical(['Anna Bianchi'] * n + ['Mario Rossi'] * n)
+    df['data_compilazione'] = pd.Timestamp('2024-01-01 08:00') + pd.to_timedelta(np.arange(2 * n), unit='D')
+    return df
+
+def dirty_frame():
+    """Export sintetico con formati sporchi, pulito da SleepDataCleaner."""
+    return SleepDataCleaner().clean_data(generate_diary(2000, n_clients=20, seed=7))
+
+@pytest.mark.parametrize('make_frame', [edge_frame, dirty_frame])
+def test_vectorized_matches_row_wise(make_frame):
+    df = make_frame()
+    calculator = SleepCalculator()
+
+    vectorized = calculator.process_dataframe(df)
+    row_wise = calculator.process_dataframe(df, vectorized=False)
+
+    assert len(vectorized) == len(row_wise) == len(df)
+    assert list(vectorized.columns) == list(row_wise.columns)
+    for col in METRIC_COLUMNS + list(ROLLING_COLUMNS):
+        np.testing.assert_allclose(
+            vectorized[col].to_numpy(dtype='float64'),
+            row_wise[col].to_numpy(dtype='float64'),
+            rtol=1e-9, equal_nan=True, err_msg=col
+        )
+    for col in METRIC_REASON_COLUMNS.values():
+        pd.testing.assert_series_equal(vectorized[col], row_wise[col])
+    expected = quality_counts(vectorized)
+    for label, counts in quality_counts(row_wise).items():
+        np.testing.assert_array_equal(counts, expected[label], err_msg=label)
+
+def test_edge_cases_bounds():
+    result = SleepCalculator().process_dataframe(edge_frame(), rolling_by_client=False)
+    first = result.iloc[:len(EDGE_ROWS)]
+    tib = first['tempo_totale_a_letto_ore'].to_numpy(dtype='float64')
+    tst = first['durata_sonno_ore'].to_numpy(dtype='float64')
+
+    # TIB valido tra 2 e 20 ore (estremi inclusi), TST tra 1 e 16 ore
+    assert tib[3] == 2 and np.isnan(tib[4]) and tib[5] == 20 and np.isnan(tib[6])
+    assert tst[7] == 1 and np.isnan(tst[8]) and tst[9] == 16 and np.isnan(tst[10])
+    # Orari uguali: il secondo è il giorno dopo (24 ore: TIB fuori range, TST 24 - 500 min valido)
+    assert np.isnan(tib[2]) and tst[2] == pytest.approx(15 + 2 / 3)
+    # Latenza e veglia mancanti contano come 0
+    assert tst[15] == 8
+    assert np.isnan(tib[-1]) and np.isnan(tst[-1])
+
+def rolling_frame(clients, days, durations):
+    """Notti minime per calculate_rolling_averages (le tre metriche rolling uguali alla durata)."""
+    durations = np.asarray(durations, dtype='float64')
+    return pd.DataFrame({
+        'nome_cliente_normalizzato': clients,
+        'data_compilazione': pd.Timestamp('2024-01-01') + pd.to_timedelta(days, unit='D'),
+        'durata_sonno_ore': durations,
+        'efficienza_sonno': durations * 10,
+        'tempo_totale_a_letto_ore': durations + 1,
+    })
+
+def test_rolling_per_client_does_not_mix_clients():
+    # Notti alternate di due clienti, in ordine di data
+    df = rolling_frame(['A', 'B'] * 4, [0, 0, 1, 1, 2, 2, 3, 3], [1, 10, 2, 20, 3, 30, 4, 40])
+    result = SleepCalculator().calculate_rolling_averages(df, window=2)
+
+    np.testing.assert_allclose(result['media_rolling_7gg_durata'], [1, 10, 1.5, 15, 2.5, 25, 3.5, 35])
+    np.testing.assert_allclose(result['media_rolling_7gg_efficienza'], [10, 100, 15, 150, 25, 250, 35, 350])
+    np.testing.assert_allclose(result['media_rolling_7gg_tib'], [2, 11, 2.5, 16, 3.5, 26, 4.5, 36])
+
+    # Senza colonna cliente: una sola finestra su tutte le notti
+    pooled = SleepCalculator().calculate_rolling_averages(df, window=2, group_col=None)
+    np.testing.assert_allclose(pooled['media_rolling_7gg_durata'], [1, 5.5, 6, 11, 11.5, 16.5, 17, 22])
+
+def test_rolling_last_seven_nights():
+    df = rolling_frame(['A'] * 9, np.arange(9), np.arange(1, 10))
+    result = SleepCalculator().calculate_rolling_averages(df)
+
+    # min_periods=1: media delle notti disponibili, poi delle ultime 7
+    np.testing.assert_allclose(result['media_rolling_7gg_durata'], [1, 1.5, 2, 2.5, 3, 3.5, 4, 5, 6])
+
+def test_rolling_calendar_days_with_gaps():
+    # Giorni 0, 1, 9, 11 e una notte senza data: la finestra copre i 7 giorni fino alla notte inclusa
+    df = rolling_frame(['A'] * 5, [0, 1, 9, 11, 0], [2, 4, 6, 8, 5])
+    df.loc[4, 'data_compilazione'] = pd.NaT
+    result = SleepCalculator().calculate_rolling_averages(df, calendar_days=True)
+
+    expected = [2, 3, 6, 7, np.nan]
+    np.testing.assert_allclose(result['media_rolling_7gg_durata'], expected, equal_nan=True)
+
+    # Con finestra per righe le lacune non contano
+    by_rows = SleepCalculator().calculate_rolling_averages(df.iloc[:4])
+    np.testing.assert_allclose(by_rows['media_rolling_7gg_durata'], [2, 3, 4, 5])
+
+def test_circular_mean_around_midnight():
+    # 23:30 e 00:30 → 00:00 (non 12:00); 23:00 e 23:00 → 23:00
+    minutes = np.array([hm(23, 30), hm(0, 30), hm(23), hm(23)], dtype='float64')
+    mean, std = SleepCalculator.circular_stats(minutes, np.array([0, 0, 1, 1]), 3)
+
+    np.testing.assert_allclose(mean[:2], [0, hm(23)], atol=1e-9)
+    # Due orari a ±30 min dalla media: R = cos(30 min), std = sqrt(-2 ln R) ≈ 30 min
+    expected_std = np.sqrt(-2 * np.log(np.cos(np.pi / 24))) * 1440 / (2 * np.pi)
+    np.testing.assert_allclose(std[:2], [expected_std, 0], atol=1e-6)
+    assert expected_std == pytest.approx(30, abs=0.1)
+    assert np.isnan(mean[2]) and np.isnan(std[2])
+
+def test_circular_overlap():
+    start_a = np.array([hm(23), hm(23), hm(23)], dtype='float64')
+    length_a = np.array([480, 60, 60], dtype='float64')
+    start_b = np.array([hm(23, 30), hm(0), hm(23, 30)], dtype='float64')
+    length_b = np.array([480, 60, 60], dtype='float64')
+    # 23:30-07:30 vs 23:00-07:00: 7h30; 23-24 vs 00-01: 0; 23-24 vs 23:30-00:30: 30 min
+    np.testing.assert_allclose(SleepCalculator.circular_overlap(start_a, length_a, start_b, length_b), [450, 0, 30])
+
+def test_regularity_metrics():
+    # Venerdì 5 e sabato 6 gennaio 2024 (data di compilazione = giorno del risveglio)
+    df = pd.DataFrame({
+        'nome_cliente_normalizzato': ['A', 'A', 'B', 'B'],
+        'data_compilazione': pd.to_datetime(['2024-01-05', '2024-01-06', '2024-01-05', '2024-01-06']),
+        'ora_letto_clean': [hm(23, 30), hm(0, 30), hm(23), hm(3)],
+        'ora_spento_luci_clean': [hm(23), hm(23), hm(23), hm(3)],
+        'ora_sveglia_finale_clean': [hm(7), hm(7), hm(7), hm(11)],
+        'latenza_minuti': [0, 0, 0, 0],
+        'durata_sonno_ore': [8, 8, 8, 8],
+    })
+    for col in ['ora_letto_clean', 'ora_spento_luci_clean', 'ora_sveglia_finale_clean']:
+        df[col] = df[col].astype('Int16')
+    result = SleepCalculator().calculate_regularity(df).set_index('nome_cliente_normalizzato')
+
+    # A: stesso sonno 23-07 due giorni di fila → SRI 100, jetlag 0; ora a letto media 00:00
+    assert result.loc['A', 'indice_regolarita'] == pytest.approx(100)
+    assert result.loc['A', 'jetlag_sociale_ore'] == pytest.approx(0)
+    assert result.loc['A', 'ora_letto_media'] == pytest.approx(0, abs=1e-9)
+    assert result.loc['A', 'ora_sveglia_media'] == pytest.approx(hm(7))
+    # B: 23-07 poi 03-11, in comune 03-07 (240 min): stato diverso per 480 min su 1440
+    # → SRI = -100 + 200 × (1 - 480/1440) = 33,3; metà sonno 03:00 → 07:00 nel weekend: +4 ore
+    assert result.loc['B', 'indice_regolarita'] == pytest.approx(100 / 3)
+    assert result.loc['B', 'jetlag_sociale_ore'] == pytest.approx(4)
@@ -0,0 +1,100 @@
+"""Archivio SQLite incrementale contro process_dataframe sul file intero."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import generate_diary
+from sleep_analyzer.data_cleaner import SleepDataCleaner
+from sleep_analyzer.sleep_calculator import SleepCalculator, ROLLING_COLUMNS
+from sleep_analyzer.sleep_store import SleepStateStore
+
+KEY = ['nome_cliente_normalizzato', 'data_compilazione']
+
+@pytest.fixture
+def raw():
+    raw = generate_diary(1500, n_clients=8, seed=5).drop_duplicates('Start time')
+    # Le notti senza nome cliente non hanno medie rolling nell'archivio (l'app le scarta)
+    return raw[raw['Inserisci il tuo Nome e Cognome'].notna()].reset_index(drop=True)
+
+@pytest.fixture
+def store(tmp_path):
+    return SleepStateStore(str(tmp_path / 'archivio.sqlite'))
+
+def in_memory(raw):
+    return SleepCalculator().process_dataframe(SleepDataCleaner().clean_data(raw))
+
+def by_key(df):
+    df = df.assign(nome_cliente_normalizzato=df['nome_cliente_normalizzato'].astype(str))
+    return df.sort_values(KEY).reset_index(drop=True)
+
+def test_ingest_in_parts_matches_full_file(raw, store):
+    # Tre parti, la centrale per ultima: le sue notti sono più vecchie di quelle archiviate
+    first, middle, last = np.array_split(np.arange(len(raw)), 3)
+    assert store.ingest(raw.iloc[first]) == len(first)
+    assert store.ingest(raw.iloc[last]) == len(last)
+    assert store.ingest(raw.iloc[middle]) == len(middle)
+    # Righe già archiviate: nessuna nuova
+    assert store.ingest(raw) == 0
+
+    stored = by_key(store.load_history())
+    expected = by_key(in_memory(raw))
+    assert len(stored) == len(expected)
+    pd.testing.assert_series_equal(stored['data_compilazione'], expected['data_compilazione'])
+    for col in ['durata_sonno_ore', 'efficienza_sonno', *ROLLING_COLUMNS]:
+        np.testing.assert_allclose(
+            stored[col].to_numpy(dtype='float64'), expected[col].to_numpy(dtype='float64'),
+            rtol=1e-6, equal_nan=True, err_msg=col
+        )
+
+def test_rolling_context_reads_only_needed_nights(raw, store):
+    store.ingest(raw.iloc[:1000])
+    new = SleepDataCleaner().clean_data(raw.iloc[1000:])
+    context = store._rolling_context(new)
+
+    assert len(context)
+    first_new = new.groupby('nome_cliente_normalizzato', observed=True)['data_compilazione'].min()
+    for client, nights in context.groupby(context['nome_cliente_normalizzato'].astype(str)):
+        before = nights[~nights['_ricalcola']]
+        # Al più 6 notti di contesto prima della prima notte nuova, e solo quelle successive da ricalcolare
+        assert len(before) <= 6
+        assert (before['data_compilazione'] <= first_new[client]).all()
+        assert (nights.loc[nights['_ricalcola'], 'data_compilazione'] > first_new[client]).all()
+
+def test_query_filters_match_in_memory(raw, store):
+    store.ingest(raw)
+    history = store.load_history()
+    clients = sorted(history['nome_cliente_normalizzato'].astype(str).unique())
+    dates = history['data_compilazione']
+    start, end = dates.quantile(0.25).date(), dates.quantile(0.75).date()
+
+    def expected(mask):
+        return by_key(history[mask])
+
+    in_range = (dates >= pd.Timestamp(start)) & (dates < pd.Timestamp(end) + pd.Timedelta(days=1))
+    is_client = history['nome_cliente_normalizzato'].astype(str) == clients[0]
+    in_clients = history['nome_cliente_normalizzato'].astype(str).isin(clients[:3])
+
+    cases = [
+        (store.query(start=start, end=end), in_range),
+        (store.query(client=clients[0]), is_client),
+        (store.query(client=clients[:3], start=start), in_clients & (dates >= pd.Timestamp(start))),
+        (store.query(client=clients[0], start=start, end=end), is_client & in_range),
+        (store.query(end=start), dates < pd.Timestamp(start) + pd.Timedelta(days=1)),
+    ]
+    for result, mask in cases:
+        assert 0 < len(result) < len(history)
+        assert result['data_compilazione'].is_monotonic_increasing
+        pd.testing.assert_frame_equal(by_key(result), expected(mask))
+
+    columns = store.query(client=clients[0], columns=['data_compilazione', 'durata_sonno_ore'])
+    assert list(columns.columns) == ['data_compilazione', 'durata_sonno_ore']
+
+def test_partitions_match_in_memory(raw, store):
+    store.ingest(raw)
+    history = store.load_history()
+    expected = history.groupby(
+        [history['nome_cliente_normalizzato'].astype(str), history['data_compilazione'].dt.strftime('%Y-%m')]
+    ).size()
+
+    partitions = store.partitions().set_index(['nome_cliente_normalizzato', 'mese'])['notti']
+    assert partitions.to_dict() == expected.to_dict()